@@ -0,0 +1,182 @@
+import asyncio
+import collections
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+from typing import Optional
+
+# Rough size-to-token ratios used to pick a lane before any text is extracted
+CHARS_PER_TOKEN = 4
+PDF_BYTES_PER_TOKEN = 20
+WAIT_SAMPLES = 256
+
+
+class AdmissionRejected(Exception):
+    """Raised when a lane's queue is full; ``retry_after`` is in seconds."""
+
+    def __init__(self, lane, retry_after):
+        super().__init__(f"Server busy: the {lane} queue is full. Retry in {retry_after} seconds.")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+def estimate_text_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def estimate_pdf_tokens(size_bytes):
+    return size_bytes // PDF_BYTES_PER_TOKEN
+
+
+@dataclass
+class Lane:
+    """A priority lane for requests of up to ``max_tokens`` estimated tokens.
+
+    At most ``concurrency`` requests run at once and at most ``max_queue``
+    wait behind them; ``max_tokens=None`` accepts any size.
+    """
+
+    name: str
+    max_tokens: Optional[int]
+    concurrency: int
+    max_queue: int
+
+    @classmethod
+    def from_env(cls, name, max_tokens, concurrency, max_queue):
+        prefix = f"ADMISSION_{name.upper()}"
+        max_tokens = os.environ.get(f"{prefix}_MAX_TOKENS", max_tokens)
+        return cls(
+            name=name,
+            max_tokens=int(max_tokens) if max_tokens not in (None, "") else None,
+            concurrency=int(os.environ.get(f"{prefix}_CONCURRENCY", concurrency)),
+            max_queue=int(os.environ.get(f"{prefix}_QUEUE_DEPTH", max_queue)),
+        )
+
+    def per_worker(self, workers):
+        """Split these limits evenly across ``workers`` processes, keeping one slot each."""
+        return replace(
+            self,
+            concurrency=max(1, self.concurrency // workers),
+            max_queue=max(1, self.max_queue // workers),
+        )
+
+
+class _LaneState:
+    def __init__(self, lane):
+        self.lane = lane
+        self.active = 0
+        self.waiters = collections.deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.waits = collections.deque(maxlen=WAIT_SAMPLES)
+        self.service_seconds = None
+
+
+class AdmissionController:
+    """Admits requests into size-based lanes with their own concurrency limits.
+
+    Small requests never queue behind large ones because each lane has its
+    own slots. A request arriving at a lane whose queue is already
+    ``max_queue`` deep is rejected at once with ``AdmissionRejected``.
+    State lives in the current process; see ``Lane.per_worker`` for
+    splitting limits between workers.
+    """
+
+    def __init__(self, lanes, default_retry_after=5):
+        self.lanes = sorted(lanes, key=lambda lane: math.inf if lane.max_tokens is None else lane.max_tokens)
+        self.default_retry_after = default_retry_after
+        self._states = {lane.name: _LaneState(lane) for lane in self.lanes}
+
+    def classify(self, estimated_tokens):
+        for lane in self.lanes:
+            if lane.max_tokens is None or estimated_tokens <= lane.max_tokens:
+                return lane
+        return self.lanes[-1]
+
+    def is_full(self, estimated_tokens):
+        """Return whether ``admit`` would reject this request right now."""
+        state = self._states[self.classify(estimated_tokens).name]
+        return state.active >= state.lane.concurrency and len(state.waiters) >= state.lane.max_queue
+
+    def check(self, estimated_tokens):
+        """Raise ``AdmissionRejected`` now if ``admit`` would reject this request."""
+        if self.is_full(estimated_tokens):
+            state = self._states[self.classify(estimated_tokens).name]
+            state.rejected += 1
+            raise AdmissionRejected(state.lane.name, self._retry_after(state))
+
+    @asynccontextmanager
+    async def admit(self, estimated_tokens):
+        state = self._states[self.classify(estimated_tokens).name]
+        await self._acquire(state)
+        started = time.monotonic()
+        try:
+            yield state.lane
+        finally:
+            elapsed = time.monotonic() - started
+            # Smoothed service time, used to suggest a Retry-After
+            if state.service_seconds is None:
+                state.service_seconds = elapsed
+            else:
+                state.service_seconds = 0.8 * state.service_seconds + 0.2 * elapsed
+            self._release(state)
+
+    async def _acquire(self, state):
+        queued_at = time.monotonic()
+        if state.active < state.lane.concurrency and not state.waiters:
+            state.active += 1
+        else:
+            if len(state.waiters) >= state.lane.max_queue:
+                state.rejected += 1
+                raise AdmissionRejected(state.lane.name, self._retry_after(state))
+            waiter = asyncio.get_running_loop().create_future()
+            state.waiters.append(waiter)
+            try:
+                # _release() hands its slot straight to the waiter it wakes
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release(state)
+                else:
+                    state.waiters.remove(waiter)
+                raise
+        state.admitted += 1
+        state.waits.append(time.monotonic() - queued_at)
+
+    def _release(self, state):
+        while state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        state.active -= 1
+
+    def _retry_after(self, state):
+        if state.service_seconds is None:
+            return self.default_retry_after
+        rounds = (len(state.waiters) + 1) / state.lane.concurrency
+        return max(1, math.ceil(state.service_seconds * rounds))
+
+    def metrics(self):
+        """Return lane counters for this process only, tagged with its pid."""
+        lanes = {}
+        for lane in self.lanes:
+            state = self._states[lane.name]
+            waits = sorted(state.waits)
+            lanes[lane.name] = {
+                "max_tokens": lane.max_tokens,
+                "concurrency": lane.concurrency,
+                "max_queue": lane.max_queue,
+                "active": state.active,
+                "queue_depth": len(state.waiters),
+                "admitted": state.admitted,
+                "rejected": state.rejected,
+                "wait_seconds": {
+                    "avg": sum(waits) / len(waits) if waits else 0.0,
+                    "p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                    "max": waits[-1] if waits else 0.0,
+                },
+            }
+        return {"pid": os.getpid(), "lanes": lanes}
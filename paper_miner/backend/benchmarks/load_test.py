@@ -0,0 +1,167 @@
+"""Load test showing how backend throughput scales with uvicorn workers.
+
+Starts the backend once per worker count through ``python main.py`` with
+``BACKEND_WORKERS`` set, against a seeded temporary database and the offline
+``local`` model provider. Several client processes mix reads of ``/history``
+and ``/paper/{id}`` with ``/upload-text/`` analyses that write new records,
+and the script prints requests per second for each run. Requests shed by
+admission control (503) are counted separately from errors.
+
+Usage (from the backend directory):
+    python benchmarks/load_test.py --workers 1 2 4 --duration 10 --write-ratio 0.1
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _seed_db(db_path, records):
+    ids = []
+    table = {}
+    for doc_id in range(1, records + 1):
+        paper_id = str(uuid.uuid4())
+        ids.append(paper_id)
+        table[str(doc_id)] = {
+            "id": paper_id,
+            "pdf_path": f"/tmp/{paper_id}.pdf",
+            "filename": f"paper_{doc_id}.pdf",
+            "mode": "scientific_paper",
+            "title": f"Paper {doc_id}",
+            "authors": "Author One, Author Two",
+            "affiliated_institute": "Institute",
+            "version": "v1",
+            "novelty": "Novelty " * 40,
+            "contributions": "Contributions " * 40,
+            "results": "Results " * 40,
+            "limitations": "Limitations " * 40,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+    db_path.write_text(json.dumps({"_default": table}))
+    return ids
+
+
+def _wait_until_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/history", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Backend did not become ready in time")
+
+
+def _client(args):
+    base_url, paper_ids, deadline, write_ratio, seed = args
+    rng = random.Random(seed)
+    session = requests.Session()
+    completed = 0
+    shed = 0
+    errors = 0
+    index = 0
+    while time.monotonic() < deadline:
+        if rng.random() < write_ratio:
+            # Unique text, so every write runs an analysis and inserts a record
+            request = lambda: session.post(
+                f"{base_url}/upload-text/",
+                json={"text": f"Clause {uuid.uuid4()}: fees may change.", "mode": "legal_document"},
+                timeout=30,
+            )
+        elif index % 4 == 0:
+            request = lambda: session.get(f"{base_url}/history", timeout=30)
+        else:
+            paper_id = paper_ids[index % len(paper_ids)]
+            request = lambda: session.get(f"{base_url}/paper/{paper_id}", timeout=30)
+        index += 1
+        try:
+            response = request()
+        except requests.RequestException:
+            errors += 1
+            continue
+        if response.ok:
+            completed += 1
+        elif response.status_code == 503:
+            shed += 1
+        else:
+            errors += 1
+    return completed, shed, errors
+
+
+def run(workers, duration, clients, records, write_ratio):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        paper_ids = _seed_db(tmp / "db.json", records)
+        port = _free_port()
+        env = dict(
+            os.environ,
+            DB_PATH=str(tmp / "db.json"),
+            PAPERS_DIR=str(tmp / "papers"),
+            BACKEND_LOG_PATH=str(tmp / "backend.log"),
+            BACKEND_WORKERS=str(workers),
+            BACKEND_PORT=str(port),
+            LLM_PROVIDER="local",
+            RETENTION_INTERVAL_SECONDS="0",
+        )
+        server = subprocess.Popen(
+            [sys.executable, "main.py"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_until_ready(base_url)
+            deadline = time.monotonic() + duration
+            with multiprocessing.Pool(clients) as pool:
+                results = pool.map(_client, [
+                    (base_url, paper_ids, deadline, write_ratio, seed) for seed in range(clients)
+                ])
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    completed, shed, errors = (sum(counts) for counts in zip(*results))
+    return completed / duration, shed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--clients", type=int, default=max(4, os.cpu_count() or 1), help="concurrent client processes")
+    parser.add_argument("--records", type=int, default=300, help="records seeded into the database")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="share of requests that are /upload-text/ analyses")
+    args = parser.parse_args()
+
+    print(f"cores={os.cpu_count()} clients={args.clients} records={args.records} write_ratio={args.write_ratio}")
+    baseline = None
+    for workers in args.workers:
+        throughput, shed, errors = run(workers, args.duration, args.clients, args.records, args.write_ratio)
+        baseline = baseline or throughput
+        print(f"workers={workers:<3} {throughput:8.1f} req/s  x{throughput / baseline:.2f}  shed={shed}  errors={errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark PDF export for 1 KB, 50 KB and 500 KB summaries.
+
+Renders each size through the warm process pool used by /export-summary and
+prints the median render time and output size. The first pool render is
+reported separately since it includes starting the workers and loading fonts.
+
+Usage (from the backend directory):
+    python benchmarks/render_benchmark.py --repeat 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rendering import PdfRenderer  # noqa: E402
+
+FONT_DIR = Path("/usr/share/fonts/truetype/dejavu")
+SIZES = {"1KB": 1024, "50KB": 50 * 1024, "500KB": 500 * 1024}
+
+PARAGRAPH = (
+    "**Finding.** The proposed method improves accuracy by 4.2% on the benchmark, "
+    "with *consistent* gains across seeds. Résumé: données multilingues, Übersicht, "
+    "обзор результатов, σύνοψη.\n\n"
+    "- Contribution one with `inline code`\n"
+    "- Contribution two, see Table 3\n\n"
+)
+
+
+def make_record(size):
+    text = (PARAGRAPH * (size // len(PARAGRAPH.encode("utf-8")) + 1))
+    text = text.encode("utf-8")[:size].decode("utf-8", "ignore")
+    return {"id": "bench", "mode": "document", "title": f"Benchmark {size} bytes",
+            "important_insights": "Key insight.", "summary": text}
+
+
+async def run(repeat, workers, timeout, font_path, bold_font_path):
+    renderer = PdfRenderer(workers=workers, timeout=timeout,
+                           regular_font_path=font_path, bold_font_path=bold_font_path)
+    try:
+        start = time.perf_counter()
+        await renderer.render(make_record(16), "benchmark")
+        print(f"cold start (pool + fonts): {time.perf_counter() - start:.3f}s")
+
+        print(f"{'size':>6} {'median_s':>9} {'min_s':>7} {'pdf_bytes':>10}")
+        for label, size in SIZES.items():
+            record = make_record(size)
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                pdf_bytes = await renderer.render(record, "benchmark")
+                timings.append(time.perf_counter() - start)
+            print(f"{label:>6} {statistics.median(timings):9.3f} {min(timings):7.3f} {len(pdf_bytes):10d}")
+    finally:
+        renderer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1, help="render pool size (0 = in-process thread)")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--font", default=os.environ.get("PDF_FONT_PATH", str(FONT_DIR / "DejaVuSans.ttf")))
+    parser.add_argument("--bold-font", default=os.environ.get("PDF_FONT_BOLD_PATH", str(FONT_DIR / "DejaVuSans-Bold.ttf")))
+    args = parser.parse_args()
+    asyncio.run(run(args.repeat, args.workers, args.timeout, args.font, args.bold_font))
+
+
+if __name__ == "__main__":
+    main()
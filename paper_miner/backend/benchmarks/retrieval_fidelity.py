@@ -0,0 +1,105 @@
+"""Compare retrieval-mode field extraction with the full-text prompt.
+
+Each fixture paper in tests/fixtures/retrieval_papers.json is padded with
+implementation-detail paragraphs to a long document by
+tests/retrieval_fixtures.py. For every paper the
+script reports prompt size for both paths and evidence recall: the share of
+fields whose gold evidence sentence is inside the excerpt sent for that field.
+With --answers, both paths are also run against the configured LLM_PROVIDER.
+For each path the script then prints latency and, per field, the token-F1
+agreement between the two answers.
+
+Usage (from the backend directory):
+    python benchmarks/retrieval_fidelity.py --min-chars 80000
+    LLM_PROVIDER=gemini python benchmarks/retrieval_fidelity.py --answers
+"""
+import argparse
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "tests"))
+
+import main  # noqa: E402
+from admission import estimate_text_tokens  # noqa: E402
+from retrieval import retrieve_contexts  # noqa: E402
+from retrieval_fixtures import evidence_recall, load_fixtures  # noqa: E402
+from retrieval_fixtures import prompt_sizes as fixture_prompt_sizes  # noqa: E402
+
+MODE = "scientific_paper"
+
+
+def prompt_sizes(text, contexts):
+    return fixture_prompt_sizes(
+        text, contexts, lambda content, fields: main.build_prompt(MODE, content, fields),
+        main.ANALYSIS_FIELDS[MODE], estimate_text_tokens)
+
+
+def token_f1(a, b):
+    a_tokens = Counter(re.findall(r"\w+", str(a).lower()))
+    b_tokens = Counter(re.findall(r"\w+", str(b).lower()))
+    overlap = sum((a_tokens & b_tokens).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(a_tokens.values())
+    recall = overlap / sum(b_tokens.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def compare_answers(text, model_name):
+    timings = {}
+    answers = {}
+    configured_min_chars = main.RETRIEVAL_MIN_CHARS
+    try:
+        for label, min_chars in (("full", 0), ("retrieval", 1)):
+            main.RETRIEVAL_MIN_CHARS = min_chars
+            start = time.perf_counter()
+            answers[label] = main.run_analysis(MODE, model_name, text)
+            timings[label] = time.perf_counter() - start
+    finally:
+        main.RETRIEVAL_MIN_CHARS = configured_min_chars
+    agreement = {
+        field: token_f1(answers["retrieval"].get(field, ""), answers["full"].get(field, ""))
+        for field in main.ANALYSIS_FIELDS[MODE]
+    }
+    return timings, agreement
+
+
+def run(min_chars, top_k, with_answers):
+    groups = main.RETRIEVAL_GROUPS[MODE]
+    model_name = main.MODEL_MAPPING[MODE]
+    recalls = []
+    print(f"{'paper':<16} {'chars':>7} {'full_tok':>9} {'retr_tok':>9} {'recall':>7}")
+    for paper, text in load_fixtures(min_chars):
+        contexts = retrieve_contexts(text, groups, top_k=top_k, chunk_chars=main.RETRIEVAL_CHUNK_CHARS,
+                                     embedding_model=main.RETRIEVAL_EMBEDDING_MODEL or None)
+        found = evidence_recall(paper, contexts)
+        recalls.extend(found.values())
+        full_tokens, retrieval_tokens = prompt_sizes(text, contexts)
+        recall = sum(found.values()) / len(found)
+        print(f"{paper['name']:<16} {len(text):7d} {full_tokens:9d} {retrieval_tokens:9d} {recall:7.2f}")
+        missed = [field for field, hit in found.items() if not hit]
+        if missed:
+            print(f"  missed evidence: {', '.join(missed)}")
+        if with_answers:
+            timings, agreement = compare_answers(text, model_name)
+            print(f"  latency full {timings['full']:.2f}s, retrieval {timings['retrieval']:.2f}s")
+            print("  agreement " + ", ".join(f"{field}={score:.2f}" for field, score in agreement.items()))
+    print(f"overall evidence recall: {sum(recalls) / len(recalls):.2f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-chars", type=int, default=max(main.RETRIEVAL_MIN_CHARS, 1))
+    parser.add_argument("--top-k", type=int, default=main.RETRIEVAL_TOP_K)
+    parser.add_argument("--answers", action="store_true", help="also run both paths against LLM_PROVIDER")
+    args = parser.parse_args()
+    run(args.min_chars, args.top_k, args.answers)
+
+
+if __name__ == "__main__":
+    main_cli()
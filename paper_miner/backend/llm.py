@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+class LLMProvider(ABC):
+    """Interface every model backend implements.
+
+    ``generate`` is blocking and returns the raw response text for ``prompt``.
+    ``fields`` maps each JSON key the caller expects to its description, for
+    backends that need to know the response schema.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, model_name, prompt, fields):
+        """Return the raw response text for ``prompt``."""
+
+    def close(self):
+        pass
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini backend with one long-lived model client per model name."""
+
+    name = "gemini"
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        self._genai = None
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _get_genai(self):
+        if self._genai is None:
+            # Imported on first use so startup does not pay for the SDK
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            logger.info("Loaded and configured Gemini SDK.")
+            self._genai = genai
+        return self._genai
+
+    def get_model(self, model_name):
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                logger.info(f"Creating Gemini model client for {model_name}")
+                model = self._get_genai().GenerativeModel(model_name)
+                self._models[model_name] = model
+            return model
+
+    def generate(self, model_name, prompt, fields):
+        response = self.get_model(model_name).generate_content(prompt)
+        return response.text
+
+    def close(self):
+        with self._lock:
+            self._models.clear()
+
+
+class LocalProvider(LLMProvider):
+    """Offline backend returning deterministic, schema-valid JSON.
+
+    The same prompt always yields the same answer, and every expected field
+    is present. ``latency`` seconds are slept per call to mimic a remote model
+    in load tests.
+    """
+
+    name = "local"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def generate(self, model_name, prompt, fields):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        digest = hashlib.sha256(f"{model_name}\n{prompt}".encode("utf-8")).hexdigest()[:12]
+        return json.dumps({
+            field: f"[{model_name} local {digest}] {description}"
+            for field, description in fields.items()
+        })
+
+
+PROVIDERS = {
+    GeminiProvider.name: lambda: GeminiProvider(api_key=os.environ.get("GEMINI_API_KEY")),
+    LocalProvider.name: lambda: LocalProvider(latency=float(os.environ.get("LOCAL_LLM_LATENCY_SECONDS", "0"))),
+}
+
+
+def create_provider(name):
+    try:
+        factory = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM provider '{name}'. Choose one of: {', '.join(sorted(PROVIDERS))}")
+    return factory()
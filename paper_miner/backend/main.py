@@ -1,26 +1,28 @@
 import os
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pypdf import PdfReader
+from fastapi.responses import JSONResponse, StreamingResponse
 import io
-import google.generativeai as genai
 from tinydb import TinyDB, Query
 import uuid
 import json
-import threading
 import re
 import logging
+import functools
+import hashlib
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
-from fpdf import FPDF, HTMLMixin
-import markdown as md
-from html import escape
 from pathlib import Path
 from datetime import datetime, timezone
-
-REPO_URL = "https://github.com/nikilpatel94/vibe_coded_apps/tree/main/paper_miner"
+from storage import InterProcessLock, changes_since, current_change_seq, insert_record, refresh_tinydb
+from retention import RetentionManager, RetentionPolicy
+from singleflight import FileClaims, SingleFlight
+from admission import AdmissionController, AdmissionRejected, Lane, estimate_pdf_tokens, estimate_text_tokens
+from llm import create_provider
+from retrieval import FieldGroup, retrieve_contexts
+from rendering import PdfRenderer, PdfRenderTimeout, derive_pdf_title
 
 # Model mapping
 MODEL_MAPPING = {
@@ -44,22 +46,134 @@ PAPERS_DIR = Path(os.environ.get("PAPERS_DIR", DEFAULT_PAPERS_DIR))
 # Paths for database and log file (configurable via environment)
 DB_PATH = Path(os.environ.get("DB_PATH", BASE_DIR / "db.json"))
 LOG_PATH = Path(os.environ.get("BACKEND_LOG_PATH", BASE_DIR / "backend.log"))
+# Lock file guarding the database across uvicorn worker processes
+DB_LOCK_PATH = Path(os.environ.get("DB_LOCK_PATH", f"{DB_PATH}.lock"))
+# Claim files that let workers share one analysis of identical concurrent uploads
+ANALYSIS_CLAIMS_DIR = Path(os.environ.get("ANALYSIS_CLAIMS_DIR", DB_PATH.parent / "analysis_claims"))
+
+# Model backend: "gemini" (default) or "local" for deterministic offline responses
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "gemini").strip().lower()
+
+# Unicode TTF fonts for exported PDFs (bold falls back to regular; core
+# latin-1 fonts are used if the regular font is missing)
+DEFAULT_FONT_DIR = Path("/usr/share/fonts/truetype/dejavu")
+PDF_FONT_PATH = os.environ.get("PDF_FONT_PATH", str(DEFAULT_FONT_DIR / "DejaVuSans.ttf"))
+PDF_FONT_BOLD_PATH = os.environ.get("PDF_FONT_BOLD_PATH", str(DEFAULT_FONT_DIR / "DejaVuSans-Bold.ttf"))
+# Processes in the PDF render pool (0 renders in a thread of the API process)
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", "2"))
+PDF_RENDER_TIMEOUT_SECONDS = float(os.environ.get("PDF_RENDER_TIMEOUT_SECONDS", "30"))
+
+# Number of uvicorn worker processes started by `python main.py`, and the port they serve on
+BACKEND_WORKERS = int(os.environ.get("BACKEND_WORKERS", "1"))
+BACKEND_PORT = int(os.environ.get("BACKEND_PORT", "8000"))
+
+# Retention limits for uploaded PDFs and stored analyses; unset means unlimited.
+# e.g. SOURCE_RETENTION_MAX_AGE_DAYS, ANALYSIS_RETENTION_MAX_COUNT
+SOURCE_RETENTION = RetentionPolicy.from_env("SOURCE_RETENTION")
+ANALYSIS_RETENTION = RetentionPolicy.from_env("ANALYSIS_RETENTION")
+# Background sweep cadence and throttling (0 disables the background task)
+RETENTION_INTERVAL_SECONDS = float(os.environ.get("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "50"))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.environ.get("RETENTION_BATCH_PAUSE_SECONDS", "0.05"))
+# Unreferenced files younger than this are left alone (uploads still in flight)
+ORPHAN_GRACE_SECONDS = float(os.environ.get("ORPHAN_GRACE_SECONDS", "3600"))
+
+# Long scientific papers are analysed from retrieved excerpts instead of the
+# full text (0 disables). Without RETRIEVAL_EMBEDDING_MODEL (a local
+# sentence-transformers model) chunks are ranked by TF-IDF.
+RETRIEVAL_MIN_CHARS = int(os.environ.get("RETRIEVAL_MIN_CHARS", "60000"))
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_CHUNK_CHARS = int(os.environ.get("RETRIEVAL_CHUNK_CHARS", "1500"))
+RETRIEVAL_EMBEDDING_MODEL = os.environ.get("RETRIEVAL_EMBEDDING_MODEL", "")
+
+# Admission lanes by estimated input tokens, each with its own concurrency and
+# queue depth; e.g. ADMISSION_SMALL_CONCURRENCY, ADMISSION_LARGE_QUEUE_DEPTH.
+# Limits are totals for the deployment and are split between the workers.
+ADMISSION_LANES = [
+    Lane.from_env("small", max_tokens=8000, concurrency=4, max_queue=16).per_worker(BACKEND_WORKERS),
+    Lane.from_env("medium", max_tokens=64000, concurrency=2, max_queue=8).per_worker(BACKEND_WORKERS),
+    Lane.from_env("large", max_tokens=None, concurrency=1, max_queue=4).per_worker(BACKEND_WORKERS),
+]
 
+logger = logging.getLogger(__name__)
 
-# Configure logging
-LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-logging.basicConfig(
-    level=logging.INFO, # Set the logging level (INFO, DEBUG, WARNING, ERROR, CRITICAL)
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(str(LOG_PATH)), # Log to a file
-        logging.StreamHandler() # Log to console
-    ]
-)
-logger = logging.getLogger(__name__)
+def configure_logging():
+    LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO, # Set the logging level (INFO, DEBUG, WARNING, ERROR, CRITICAL)
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(str(LOG_PATH)), # Log to a file
+            logging.StreamHandler() # Log to console
+        ]
+    )
+
+
+# Heavy dependencies are imported on first use and shared afterwards, so
+# workers that only serve /history never pay for the Gemini SDK or PDF stack.
+
+@functools.lru_cache(maxsize=None)
+def get_llm_provider():
+    # The Gemini provider reads GEMINI_API_KEY and imports its SDK lazily
+    provider = create_provider(LLM_PROVIDER)
+    logger.info(f"Using LLM provider: {provider.name}")
+    return provider
+
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_reader():
+    from pypdf import PdfReader
+    return PdfReader
+
+
+@functools.lru_cache(maxsize=None)
+def get_web_client():
+    import requests
+    from bs4 import BeautifulSoup
+    return requests, BeautifulSoup
 
-app = FastAPI()
+
+def startup():
+    global db
+    configure_logging()
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    db = TinyDB(str(DB_PATH))
+    logger.info(f"Opened database at {DB_PATH}")
+
+
+def shutdown():
+    global db
+    pdf_renderer.close()
+    if get_llm_provider.cache_info().currsize:
+        get_llm_provider().close()
+        get_llm_provider.cache_clear()
+    with db_lock:
+        if db is not None:
+            db.close()
+            db = None
+    logger.info("Closed database.")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    startup()
+    retention_task = None
+    if RETENTION_INTERVAL_SECONDS > 0:
+        retention_task = asyncio.create_task(retention_manager.run_forever(RETENTION_INTERVAL_SECONDS))
+    try:
+        yield
+    finally:
+        if retention_task is not None:
+            retention_task.cancel()
+            try:
+                await retention_task
+            except asyncio.CancelledError:
+                pass
+        shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -73,17 +187,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure Gemini API (replace with your actual API key or environment variable)
-# It's recommended to use environment variables for API keys in production
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-
-# Initialize TinyDB
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-db = TinyDB(str(DB_PATH))
-db_lock = threading.Lock()
+# TinyDB handle, opened in startup() and closed in shutdown()
+db = None
+# Held around every database access: shared for reads, so workers read
+# concurrently, and exclusive for writes. Taking it drops TinyDB's
+# per-process caches that other workers may have invalidated
+db_lock = InterProcessLock(DB_LOCK_PATH, on_acquire=lambda: refresh_tinydb(db))
 Paper = Query()
 
 
+def _with_lock(shared, fn, args):
+    with (db_lock.shared() if shared else db_lock):
+        return fn(*args)
+
+
+async def db_read(fn, *args):
+    """Run ``fn(*args)`` under the shared database lock, off the event loop."""
+    return await asyncio.to_thread(_with_lock, True, fn, args)
+
+
+async def db_write(fn, *args):
+    """Run ``fn(*args)`` under the exclusive database lock, off the event loop."""
+    return await asyncio.to_thread(_with_lock, False, fn, args)
+
+# Started on the first export; each pool process loads fonts once
+pdf_renderer = PdfRenderer(
+    workers=PDF_RENDER_WORKERS,
+    timeout=PDF_RENDER_TIMEOUT_SECONDS,
+    regular_font_path=PDF_FONT_PATH,
+    bold_font_path=PDF_FONT_BOLD_PATH,
+)
+
+retention_manager = RetentionManager(
+    get_db=lambda: db,
+    db_lock=db_lock,
+    papers_dir=PAPERS_DIR,
+    db_path=DB_PATH,
+    lock_path=f"{DB_PATH}.retention.lock",
+    source_policy=SOURCE_RETENTION,
+    analysis_policy=ANALYSIS_RETENTION,
+    batch_size=RETENTION_BATCH_SIZE,
+    batch_pause=RETENTION_BATCH_PAUSE_SECONDS,
+    orphan_grace_seconds=ORPHAN_GRACE_SECONDS,
+)
+
+
 def ensure_papers_dir():
     PAPERS_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -99,119 +247,160 @@ class WebIn(BaseModel):
     mode: Optional[str] = "web"
 
 
-def _stringify(value):
-    if value is None:
-        return ""
-    if isinstance(value, list):
-        return "\n\n".join(str(item) for item in value)
-    return str(value)
+# Fields the model is asked to return for each mode, with their descriptions
+ANALYSIS_FIELDS = {
+    "scientific_paper": {
+        "title": "Title of the paper",
+        "authors": "Comma-separated list of authors",
+        "affiliated_institute": "Affiliated institute or organization",
+        "version": "Version or publication date (e.g., v1, June 2023)",
+        "novelty": "Summarize its novelty in a concise and scientific manner, citing specific parts of the text if possible.",
+        "contributions": "Summarize its main contributions in a concise and scientific manner, citing specific parts of the text if possible.",
+        "results": "Summarize the justified results mentioned in the paper, explaining how they support the claims, citing specific parts of the text if possible.",
+        "limitations": "Identify the limitations and trade-offs of the method/approach mentioned in the paper, citing specific parts of the text if possible.",
+    },
+    "document": {
+        "important_insights": "Summarize the most important insights or key takeaways from the document.",
+        "summary": "Provide a concise summary of the entire document.",
+    },
+    "legal_document": {
+        "benefits": "What are the benefits that the user is getting?",
+        "traps": "What are the traps imposed by the provider?",
+        "advisability": "Is it advisable to sign it? (Yes/No/Maybe with a brief explanation)",
+    },
+    "web": {
+        "summary": "Provide a detailed, analytical summary of the web page content.",
+        "takeaways": "List the key takeaways or insights from the text. If there are none, state 'No specific takeaways found'.",
+    },
+}
 
+# Instruction and text label used around the field list for each mode
+ANALYSIS_PROMPTS = {
+    "scientific_paper": ('Analyze the following research paper text and provide the following information in a JSON format. If a field is not found, use "Unknown" or "Not Found" as the value.', "Paper Text"),
+    "document": ('Analyze the following document text and provide the following information in a JSON format. If a field is not found, use "Unknown" or "Not Found" as the value.', "Document Text"),
+    "legal_document": ("Analyze the following legal document text and provide the following information in a JSON format.", "Document Text"),
+    "web": ("Analyze the following web page text and provide the following information in a JSON format.", "Web Page Text"),
+}
 
-def _safe_pdf_text(value: str) -> str:
-    return _stringify(value).encode("latin-1", "ignore").decode("latin-1")
 
+# Field groups for retrieval mode; each group is one model call over the
+# chunks matching its query. Title-page fields always see the first chunk.
+RETRIEVAL_GROUPS = {
+    "scientific_paper": [
+        FieldGroup(("title", "authors", "affiliated_institute", "version"),
+                   "authors affiliation university institute department laboratory email arxiv version preprint "
+                   "published conference journal proceedings", include_lead=True),
+        FieldGroup(("novelty",), "novel novelty first approach unlike prior existing work differs new idea"),
+        FieldGroup(("contributions",), "contributions contribution we propose introduce present summary main"),
+        FieldGroup(("results",), "results experiments evaluation outperforms improvement accuracy baseline benchmark table"),
+        FieldGroup(("limitations",), "limitations limitation drawback trade-off future work fails cost however restricted"),
+    ],
+}
 
-def _prepare_pdf_sections(record):
-    mode = record.get("mode", "scientific_paper")
-    sections = []
-
-    if mode == "scientific_paper":
-        sections.extend([
-            ("Authors", _stringify(record.get("authors", "Not Found"))),
-            ("Affiliated Institute", _stringify(record.get("affiliated_institute", "Not Found"))),
-            ("Version", _stringify(record.get("version", "Not Found"))),
-            ("Novelty", _stringify(record.get("novelty", "Not Found"))),
-            ("Contributions", _stringify(record.get("contributions", "Not Found"))),
-            ("Results", _stringify(record.get("results", "Not Found"))),
-            ("Limitations", _stringify(record.get("limitations", "Not Found"))),
-        ])
-    elif mode == "document":
-        sections.extend([
-            ("Important Insights", _stringify(record.get("important_insights", "Not Found"))),
-            ("Summary", _stringify(record.get("summary", "Not Found"))),
-        ])
-    elif mode == "legal_document":
-        sections.extend([
-            ("Benefits", _stringify(record.get("benefits", "Not Found"))),
-            ("Traps", _stringify(record.get("traps", "Not Found"))),
-            ("Advisability", _stringify(record.get("advisability", "Not Found"))),
-        ])
-    elif mode == "web":
-        sections.extend([
-            ("URL", _stringify(record.get("url", "Not Found"))),
-            ("Summary", _stringify(record.get("summary", "Not Found"))),
-            ("Takeaways", _stringify(record.get("takeaways", "Not Found"))),
-        ])
-    else:
-        for key, value in record.items():
-            if key in {"id", "pdf_path", "filename", "mode", "title"}:
-                continue
-            sections.append((key.replace("_", " ").title(), _stringify(value)))
 
-    filtered_sections = [(header, text) for header, text in sections if _stringify(text).strip()]
-    return filtered_sections or [("Summary", "No data available for this entry.")]
+def build_prompt(mode, text_content, fields=None):
+    instruction, text_label = ANALYSIS_PROMPTS[mode]
+    field_spec = json.dumps(fields or ANALYSIS_FIELDS[mode], indent=4)
+    return f"{instruction}\n\n{field_spec}\n\n{text_label}:\n\n{text_content}"
 
 
-def _derive_pdf_title(record):
-    mode = record.get("mode", "scientific_paper")
-    default_titles = {
-        "scientific_paper": "Scientific Paper Summary",
-        "document": "Document Summary",
-        "legal_document": "Legal Document Summary",
-        "web": "Web Page Summary",
-    }
-    return _stringify(record.get("title")) or _stringify(record.get("filename")) or default_titles.get(mode, "Analysis Summary")
+# Concurrent requests for the same content, mode and model share one analysis:
+# within a worker through analysis_flights, and between workers through claim
+# files (only needed when there is more than one worker)
+analysis_flights = SingleFlight()
+analysis_claims = FileClaims(ANALYSIS_CLAIMS_DIR) if BACKEND_WORKERS > 1 else None
+admission = AdmissionController(ADMISSION_LANES)
+
+
+async def _analyze_once(key, estimated_tokens, work):
+    """Run ``work`` for ``key`` once across concurrent callers, within an admission lane."""
+    async def admitted():
+        # Admitted inside the shared flight, so duplicates take a single lane slot
+        async with admission.admit(estimated_tokens):
+            return await work()
 
+    if analysis_claims is None:
+        return await analysis_flights.do(key, admitted)
+    return await analysis_flights.do(key, lambda: analysis_claims.run(key, admitted))
 
-class MarkdownPDF(FPDF, HTMLMixin):
-    pass
 
+def _overloaded(error):
+    logger.warning(str(error))
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(error.retry_after)})
 
-def generate_pdf_content(record, author):
-    pdf_title = _derive_pdf_title(record)
-    sections = _prepare_pdf_sections(record)
 
-    pdf = MarkdownPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_title(pdf_title)
-    pdf.set_author(author)
+def _analysis_key(content, mode, model_name):
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return (hashlib.sha256(content).hexdigest(), mode, model_name)
 
-    pdf.set_font("Arial", "B", 18)
-    pdf.set_text_color(30, 30, 30)
-    pdf.multi_cell(0, 10, _safe_pdf_text(pdf_title), align="C")
-    pdf.ln(5)
 
-    pdf.set_font("Arial", "I", 11)
-    pdf.set_text_color(90, 90, 90)
-    pdf.multi_cell(0, 8, _safe_pdf_text(f"Generated by: {author}"), align="C")
-    pdf.ln(2)
-    pdf.set_font("Arial", "", 11)
-    pdf.set_text_color(60, 120, 200)
-    pdf.multi_cell(0, 8, _safe_pdf_text("Project GitHub Repository"), align="C", link=REPO_URL)
-    pdf.ln(8)
+def _parse_model_json(response_text):
+    # Attempt to parse the JSON response
+    try:
+        analysis_data = json.loads(response_text)
+        logger.info(f"Successfully parsed Gemini API response. Analysis Data: {analysis_data}")
+    except json.JSONDecodeError:
+        logger.warning("Direct JSON parsing failed. Attempting to extract JSON from markdown code block.")
+        # If direct JSON parsing fails, try to extract JSON from markdown code block
+        json_match = re.search(r"```json\n([\s\S]*?)\n```", response_text)
+        if json_match:
+            analysis_data = json.loads(json_match.group(1))
+            logger.info(f"Successfully extracted and parsed JSON from markdown code block. Analysis Data: {analysis_data}")
+        else:
+            logger.error("Could not parse JSON from Gemini API response after multiple attempts.")
+            raise ValueError("Could not parse JSON from Gemini API response.")
+    return analysis_data
 
-    pdf.set_text_color(40, 40, 40)
 
-    pdf.set_font("Arial", "", 12)
+def run_analysis(mode, model_name, text_content):
+    """Prompt the model for ``mode`` and return the parsed JSON analysis (blocking)."""
+    provider = get_llm_provider()
+    if mode in RETRIEVAL_GROUPS and 0 < RETRIEVAL_MIN_CHARS <= len(text_content):
+        return run_retrieval_analysis(provider, mode, model_name, text_content)
+    analysis_prompt = build_prompt(mode, text_content)
 
-    for header, body in sections:
-        header_html = f"<h3>{escape(header)}</h3>"
-        body_markdown = _stringify(body)
-        body_html = md.markdown(body_markdown, extensions=["extra", "sane_lists", "nl2br"])
-        combined_html = header_html + body_html + "<br>"
-        pdf.write_html(_safe_pdf_text(combined_html))
-        pdf.ln(2)
+    logger.info(f"Sending request to {provider.name} provider using model {model_name}.")
+    response_text = provider.generate(model_name, analysis_prompt, ANALYSIS_FIELDS[mode])
+    return _parse_model_json(response_text)
+
+
+def run_retrieval_analysis(provider, mode, model_name, text_content):
+    """Answer each field group from its top-k retrieved chunks, one model call per group."""
+    groups = RETRIEVAL_GROUPS[mode]
+    contexts = retrieve_contexts(
+        text_content, groups, top_k=RETRIEVAL_TOP_K, chunk_chars=RETRIEVAL_CHUNK_CHARS,
+        embedding_model=RETRIEVAL_EMBEDDING_MODEL or None)
+
+    def analyze_group(group):
+        fields = {field: ANALYSIS_FIELDS[mode][field] for field in group.fields}
+        response_text = provider.generate(model_name, build_prompt(mode, contexts[group], fields), fields)
+        return _parse_model_json(response_text)
+
+    logger.info(f"Sending {len(groups)} retrieval requests to {provider.name} provider using model {model_name}.")
+    analysis_data = {}
+    with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+        for group, group_data in zip(groups, executor.map(analyze_group, groups)):
+            analysis_data.update({field: group_data.get(field, "Not Found") for field in group.fields})
+    return analysis_data
+
+
+def extract_pdf_text(pdf_bytes):
+    pdf_reader = get_pdf_reader()(io.BytesIO(pdf_bytes))
+    text_content = ""
+    for page in pdf_reader.pages:
+        text_content += page.extract_text()
+    return text_content
 
-    footer_html = (
-        f"<hr><p>Discover more at <a href=\"{REPO_URL}\">{REPO_URL}</a></p>"
-    )
-    pdf.write_html(_safe_pdf_text(footer_html))
 
-    raw = pdf.output(dest="S")
-    if isinstance(raw, str):
-        return raw.encode("latin-1", "ignore")
-    return bytes(raw)
+def analyze_pdf(pdf_bytes, mode, model_name, filename):
+    logger.info(f"Extracting text from PDF: {filename}")
+    text_content = extract_pdf_text(pdf_bytes)
+    if not text_content:
+        logger.error(f"Could not extract text from PDF: {filename}")
+        raise HTTPException(status_code=400, detail="Could not extract text from PDF.")
+    return run_analysis(mode, model_name, text_content)
+
 
 @app.post("/upload-text/")
 async def upload_text(text_in: TextIn):
@@ -227,44 +416,15 @@ async def upload_text(text_in: TextIn):
             logger.error(f"No text provided.")
             raise HTTPException(status_code=400, detail="No text provided.")
 
-        logger.info("Initializing Gemini model and preparing prompt.")
-        # Initialize the Gemini model
-                # Initialize the Gemini model
-        model_name = MODEL_MAPPING.get(text_in.mode, MODEL_MAPPING["default"])
-        model = genai.GenerativeModel(model_name)
-
-        if text_in.mode == "legal_document":
-            # Define a comprehensive prompt for extracting all required information for legal documents
-            analysis_prompt = f"""Analyze the following legal document text and provide the following information in a JSON format.
-
-            {{
-                "benefits": "What are the benefits that the user is getting?",
-                "traps": "What are the traps imposed by the provider?",
-                "advisability": "Is it advisable to sign it? (Yes/No/Maybe with a brief explanation)"
-            }}
-
-            Document Text:\n\n{text_content}"""
-        else:
+        if text_in.mode != "legal_document":
             raise HTTPException(status_code=400, detail="Invalid analysis mode specified. Use 'legal_document'.")
 
-        logger.info("Sending request to Gemini API.")
-        # Generate content using Gemini API
-        response = model.generate_content(analysis_prompt)
-        
-        # Attempt to parse the JSON response
-        try:
-            analysis_data = json.loads(response.text)
-            logger.info(f"Successfully parsed Gemini API response. Analysis Data: {analysis_data}")
-        except json.JSONDecodeError:
-            logger.warning("Direct JSON parsing failed. Attempting to extract JSON from markdown code block.")
-            # If direct JSON parsing fails, try to extract JSON from markdown code block
-            json_match = re.search(r"```json\n([\s\S]*?)\n```", response.text)
-            if json_match:
-                analysis_data = json.loads(json_match.group(1))
-                logger.info(f"Successfully extracted and parsed JSON from markdown code block. Analysis Data: {analysis_data}")
-            else:
-                logger.error("Could not parse JSON from Gemini API response after multiple attempts.")
-                raise ValueError("Could not parse JSON from Gemini API response.")
+        model_name = MODEL_MAPPING.get(text_in.mode, MODEL_MAPPING["default"])
+        analysis_data = await _analyze_once(
+            _analysis_key(text_content, text_in.mode, model_name),
+            estimate_text_tokens(text_content),
+            lambda: asyncio.to_thread(run_analysis, text_in.mode, model_name, text_content),
+        )
 
         logger.info(f"Storing analysis data for paper ID: {paper_id}")
         # Store data in TinyDB
@@ -278,8 +438,7 @@ async def upload_text(text_in: TextIn):
                 "advisability": analysis_data.get("advisability", "Not Found"),
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
-            with db_lock:
-                db.insert(data_to_insert)
+            await db_write(insert_record, db, data_to_insert)
             logger.info(f"Inserted legal document data into DB: {data_to_insert}")
             return_data = {
                 "id": paper_id,
@@ -290,6 +449,8 @@ async def upload_text(text_in: TextIn):
             }
             logger.info(f"Returning legal document data: {return_data}")
             return return_data
+    except AdmissionRejected as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.exception(f"Error processing text or Gemini API call")
         raise HTTPException(status_code=500, detail=f"Error processing text or Gemini API call: {e}")
@@ -297,6 +458,7 @@ async def upload_text(text_in: TextIn):
 @app.post("/upload-web/")
 async def upload_web(web_in: WebIn):
     logger.info(f"Received upload request for web page with URL: {web_in.url}")
+    requests, BeautifulSoup = get_web_client()
 
     try:
         # Validate URL format
@@ -323,39 +485,13 @@ async def upload_web(web_in: WebIn):
         # Generate a unique ID for the paper
         paper_id = str(uuid.uuid4())
 
-        logger.info("Initializing Gemini model and preparing prompt.")
-        # Initialize the Gemini model
+        # The web prompt is used regardless of the requested mode
         model_name = MODEL_MAPPING.get(web_in.mode, MODEL_MAPPING["default"])
-        model = genai.GenerativeModel(model_name)
-
-        # Define a prompt for summarizing web content
-        analysis_prompt = f"""Analyze the following web page text and provide the following information in a JSON format.
-
-        {{
-            "summary": "Provide a detailed, analytical summary of the web page content.",
-            "takeaways": "List the key takeaways or insights from the text. If there are none, state 'No specific takeaways found'."
-        }}
-
-        Web Page Text:\n\n{text_content}"""
-
-        logger.info("Sending request to Gemini API.")
-        # Generate content using Gemini API
-        response = model.generate_content(analysis_prompt)
-
-        # Attempt to parse the JSON response
-        try:
-            analysis_data = json.loads(response.text)
-            logger.info(f"Successfully parsed Gemini API response. Analysis Data: {analysis_data}")
-        except json.JSONDecodeError:
-            logger.warning("Direct JSON parsing failed. Attempting to extract JSON from markdown code block.")
-            # If direct JSON parsing fails, try to extract JSON from markdown code block
-            json_match = re.search(r"```json\n([\s\S]*?)\n```", response.text)
-            if json_match:
-                analysis_data = json.loads(json_match.group(1))
-                logger.info(f"Successfully extracted and parsed JSON from markdown code block. Analysis Data: {analysis_data}")
-            else:
-                logger.error("Could not parse JSON from Gemini API response after multiple attempts.")
-                raise ValueError("Could not parse JSON from Gemini API response.")
+        analysis_data = await _analyze_once(
+            _analysis_key(text_content, "web", model_name),
+            estimate_text_tokens(text_content),
+            lambda: asyncio.to_thread(run_analysis, "web", model_name, text_content),
+        )
 
         logger.info(f"Storing analysis data for paper ID: {paper_id}")
         # Store data in TinyDB
@@ -368,8 +504,7 @@ async def upload_web(web_in: WebIn):
             "takeaways": analysis_data.get("takeaways", "Not Found"),
             "created_at": datetime.now(timezone.utc).isoformat()
         }
-        with db_lock:
-            db.insert(data_to_insert)
+        await db_write(insert_record, db, data_to_insert)
         logger.info(f"Inserted web page data into DB: {data_to_insert}")
         return_data = {
             "id": paper_id,
@@ -381,6 +516,8 @@ async def upload_web(web_in: WebIn):
         }
         logger.info(f"Returning web page data: {return_data}")
         return return_data
+    except AdmissionRejected as e:
+        raise _overloaded(e)
     except requests.exceptions.RequestException as e:
         logger.exception(f"Error fetching URL: {web_in.url}")
         raise HTTPException(status_code=400, detail=f"Error fetching URL: {e}")
@@ -404,86 +541,30 @@ async def upload_pdf(file: UploadFile = File(...), mode: str = Form(...)):
         ensure_papers_dir()
         pdf_path = PAPERS_DIR / pdf_filename
 
-        logger.info(f"Saving PDF to {pdf_path}")
-        # Save the PDF file locally
-        with pdf_path.open("wb") as buffer:
-            buffer.write(await file.read())
-
-        logger.info(f"Extracting text from PDF: {file.filename}")
-        # Read the PDF file content
-        with pdf_path.open("rb") as f_obj:
-            pdf_reader = PdfReader(io.BytesIO(f_obj.read()))
-        text_content = ""
-        for page in pdf_reader.pages:
-            text_content += page.extract_text()
-
-        if not text_content:
-            logger.error(f"Could not extract text from PDF: {file.filename}")
-            raise HTTPException(status_code=400, detail="Could not extract text from PDF.")
+        if mode not in {"scientific_paper", "document", "legal_document"}:
+            raise HTTPException(status_code=400, detail="Invalid analysis mode specified. Use 'scientific_paper', 'document', or 'legal_document'.")
 
-        logger.info("Initializing Gemini model and preparing prompt.")
-        # Initialize the Gemini model
         model_name = MODEL_MAPPING.get(mode, MODEL_MAPPING["default"])
-        model = genai.GenerativeModel(model_name)
-
-        if mode == "scientific_paper":
-            # Define a comprehensive prompt for extracting all required information for scientific papers
-            analysis_prompt = f"""Analyze the following research paper text and provide the following information in a JSON format. If a field is not found, use "Unknown" or "Not Found" as the value.
-
-            {{
-                "title": "Title of the paper",
-                "authors": "Comma-separated list of authors",
-                "affiliated_institute": "Affiliated institute or organization",
-                "version": "Version or publication date (e.g., v1, June 2023)",
-                "novelty": "Summarize its novelty in a concise and scientific manner, citing specific parts of the text if possible.",
-                "contributions": "Summarize its main contributions in a concise and scientific manner, citing specific parts of the text if possible.",
-                "results": "Summarize the justified results mentioned in the paper, explaining how they support the claims, citing specific parts of the text if possible.",
-                "limitations": "Identify the limitations and trade-offs of the method/approach mentioned in the paper, citing specific parts of the text if possible."
-            }}
-
-            Paper Text:\n\n{text_content}"""
-        elif mode == "document":
-            # Define a prompt for generic documents
-            analysis_prompt = f"""Analyze the following document text and provide the following information in a JSON format. If a field is not found, use "Unknown" or "Not Found" as the value.
-
-            {{
-                "important_insights": "Summarize the most important insights or key takeaways from the document.",
-                "summary": "Provide a concise summary of the entire document."
-            }}
-
-            Document Text:\n\n{text_content}"""
-        elif mode == "legal_document":
-            # Define a comprehensive prompt for extracting all required information for legal documents
-            analysis_prompt = f"""Analyze the following legal document text and provide the following information in a JSON format.
-
-            {{
-                "benefits": "What are the benefits that the user is getting?",
-                "traps": "What are the traps imposed by the provider?",
-                "advisability": "Is it advisable to sign it? (Yes/No/Maybe with a brief explanation)"
-            }}
-
-            Document Text:\n\n{text_content}"""
+        if file.size is not None and admission.is_full(estimate_pdf_tokens(file.size)):
+            # Shed load early when the lane is full, unless an identical upload
+            # is already being analysed here and this request can join it
+            pdf_bytes = await file.read()
+            analysis_key = _analysis_key(pdf_bytes, mode, model_name)
+            if not analysis_flights.is_running(analysis_key):
+                admission.check(estimate_pdf_tokens(file.size))
         else:
-            raise HTTPException(status_code=400, detail="Invalid analysis mode specified. Use 'scientific_paper', 'document', or 'legal_document'.")
+            pdf_bytes = await file.read()
+            analysis_key = _analysis_key(pdf_bytes, mode, model_name)
 
-        logger.info("Sending request to Gemini API.")
-        # Generate content using Gemini API
-        response = model.generate_content(analysis_prompt)
-        
-        # Attempt to parse the JSON response
-        try:
-            analysis_data = json.loads(response.text)
-            logger.info(f"Successfully parsed Gemini API response. Analysis Data: {analysis_data}")
-        except json.JSONDecodeError:
-            logger.warning("Direct JSON parsing failed. Attempting to extract JSON from markdown code block.")
-            # If direct JSON parsing fails, try to extract JSON from markdown code block
-            json_match = re.search(r"```json\n([\s\S]*?)\n```", response.text)
-            if json_match:
-                analysis_data = json.loads(json_match.group(1))
-                logger.info(f"Successfully extracted and parsed JSON from markdown code block. Analysis Data: {analysis_data}")
-            else:
-                logger.error("Could not parse JSON from Gemini API response after multiple attempts.")
-                raise ValueError("Could not parse JSON from Gemini API response.")
+        analysis_data = await _analyze_once(
+            analysis_key,
+            estimate_pdf_tokens(len(pdf_bytes)),
+            lambda: asyncio.to_thread(analyze_pdf, pdf_bytes, mode, model_name, file.filename),
+        )
+
+        # Only analysed uploads are kept, so rejected or failed ones leave no file behind
+        logger.info(f"Saving PDF to {pdf_path}")
+        await asyncio.to_thread(pdf_path.write_bytes, pdf_bytes)
 
         logger.info(f"Storing analysis data for paper ID: {paper_id}")
         # Store data in TinyDB
@@ -503,8 +584,7 @@ async def upload_pdf(file: UploadFile = File(...), mode: str = Form(...)):
                 "limitations": analysis_data.get("limitations", "Not Found"),
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
-            with db_lock:
-                db.insert(data_to_insert)
+            await db_write(insert_record, db, data_to_insert)
             logger.info(f"Inserted scientific paper data into DB: {data_to_insert}")
             logger.info(f"Inserted scientific paper data into DB: {data_to_insert}")
             return_data = {
@@ -532,8 +612,7 @@ async def upload_pdf(file: UploadFile = File(...), mode: str = Form(...)):
                 "summary": analysis_data.get("summary", "Not Found"),
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
-            with db_lock:
-                db.insert(data_to_insert)
+            await db_write(insert_record, db, data_to_insert)
             logger.info(f"Inserted document data into DB: {data_to_insert}")
             return_data = {
                 "id": paper_id,
@@ -555,8 +634,7 @@ async def upload_pdf(file: UploadFile = File(...), mode: str = Form(...)):
                 "advisability": analysis_data.get("advisability", "Not Found"),
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
-            with db_lock:
-                db.insert(data_to_insert)
+            await db_write(insert_record, db, data_to_insert)
             logger.info(f"Inserted legal document data into DB: {data_to_insert}")
             return_data = {
                 "id": paper_id,
@@ -568,75 +646,105 @@ async def upload_pdf(file: UploadFile = File(...), mode: str = Form(...)):
             }
             logger.info(f"Returning legal document data: {return_data}")
             return return_data
+    except AdmissionRejected as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.exception(f"Error processing PDF or Gemini API call for {file.filename}")
         raise HTTPException(status_code=500, detail=f"Error processing PDF or Gemini API call: {e}")
 
+def _history_summary(p):
+    """Return the fields of record ``p`` shown in the history list."""
+    if p.get("mode") == "scientific_paper":
+        return {
+            "id": p["id"],
+            "filename": p["filename"],
+            "mode": p.get("mode"),
+            "title": p.get("title", "Not Found"),
+            "authors": p.get("authors", "Not Found"),
+            "affiliated_institute": p.get("affiliated_institute", "Not Found"),
+            "version": p.get("version", "Not Found"),
+            "created_at": p.get("created_at", "Not Found")
+        }
+    elif p.get("mode") == "document":
+        return {
+            "id": p["id"],
+            "filename": p["filename"],
+            "mode": p.get("mode"),
+            "summary": p.get("summary", "Not Found"),
+            "created_at": p.get("created_at", "Not Found")
+        }
+    elif p.get("mode") == "legal_document":
+        return {
+            "id": p["id"],
+            "filename": p.get("filename"),
+            "mode": p.get("mode"),
+            "benefits": p.get("benefits", "Not Found"),
+            "traps": p.get("traps", "Not Found"),
+            "advisability": p.get("advisability", "Not Found"),
+            "created_at": p.get("created_at", "Not Found")
+        }
+    elif p.get("mode") == "web":
+        return {
+            "id": p["id"],
+            "mode": p.get("mode"),
+            "title": p.get("title", "Not Found"),
+            "url": p.get("url", "Not Found"),
+            "takeaways": p.get("takeaways", "Not Found"),
+            "created_at": p.get("created_at", "Not Found")
+        }
+    else: # For backward compatibility with old entries without a mode
+        return {
+            "id": p["id"],
+            "filename": p["filename"],
+            "mode": "scientific_paper", # Assume scientific_paper for old entries
+            "title": p.get("title", "Not Found"),
+            "authors": p.get("authors", "Not Found"),
+            "affiliated_institute": p.get("affiliated_institute", "Not Found"),
+            "version": p.get("version", "Not Found"),
+            "created_at": p.get("created_at", "Not Found")
+        }
+
+
+def _history_etag(seq, count):
+    # Every write advances the change sequence, so it identifies the list
+    return f'"history-{seq}-{count}"'
+
+
 @app.get("/history")
-async def get_history():
+async def get_history(request: Request):
     logger.info("Received request for history list.")
-    with db_lock:
-        papers = db.all()
+    papers, seq = await db_read(lambda: (db.all(), current_change_seq(db)))
+    etag = _history_etag(seq, len(papers))
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
     logger.info(f"Found {len(papers)} papers in history.")
     # Return a summary for the history list
-    history_summary = []
-    for p in papers:
-        if p.get("mode") == "scientific_paper":
-            history_summary.append({
-                "id": p["id"],
-                "filename": p["filename"],
-                "mode": p.get("mode"),
-                "title": p.get("title", "Not Found"),
-                "authors": p.get("authors", "Not Found"),
-                "affiliated_institute": p.get("affiliated_institute", "Not Found"),
-                "version": p.get("version", "Not Found"),
-                "created_at": p.get("created_at", "Not Found")
-            })
-        elif p.get("mode") == "document":
-            history_summary.append({
-                "id": p["id"],
-                "filename": p["filename"],
-                "mode": p.get("mode"),
-                "summary": p.get("summary", "Not Found"),
-                "created_at": p.get("created_at", "Not Found")
-            })
-        elif p.get("mode") == "legal_document":
-            history_summary.append({
-                "id": p["id"],
-                "filename": p.get("filename"),
-                "mode": p.get("mode"),
-                "benefits": p.get("benefits", "Not Found"),
-                "traps": p.get("traps", "Not Found"),
-                "advisability": p.get("advisability", "Not Found"),
-                "created_at": p.get("created_at", "Not Found")
-            })
-        elif p.get("mode") == "web":
-            history_summary.append({
-                "id": p["id"],
-                "mode": p.get("mode"),
-                "title": p.get("title", "Not Found"),
-                "url": p.get("url", "Not Found"),
-                "takeaways": p.get("takeaways", "Not Found"),
-                "created_at": p.get("created_at", "Not Found")
-            })
-        else: # For backward compatibility with old entries without a mode
-            history_summary.append({
-                "id": p["id"],
-                "filename": p["filename"],
-                "mode": "scientific_paper", # Assume scientific_paper for old entries
-                "title": p.get("title", "Not Found"),
-                "authors": p.get("authors", "Not Found"),
-                "affiliated_institute": p.get("affiliated_institute", "Not Found"),
-                "version": p.get("version", "Not Found"),
-                "created_at": p.get("created_at", "Not Found")
-            })
-    return history_summary
+    history_summary = [_history_summary(p) for p in papers]
+    return JSONResponse(history_summary, headers={"ETag": etag})
+
+@app.get("/history/changes")
+async def get_history_changes(since: int = 0):
+    """Return history entries added, updated or deleted after change ``since``.
+
+    Clients pass back the ``seq`` of their previous response. When their copy
+    can no longer be brought up to date incrementally ``reset`` is true and
+    ``added`` holds the full list.
+    """
+    changes = await db_read(changes_since, db, since)
+    logger.info(f"History changes since {since}: {len(changes['added'])} added, "
+                f"{len(changes['updated'])} updated, {len(changes['deleted'])} deleted (reset={changes['reset']}).")
+    return {
+        "seq": changes["seq"],
+        "reset": changes["reset"],
+        "added": [_history_summary(p) for p in changes["added"]],
+        "updated": [_history_summary(p) for p in changes["updated"]],
+        "deleted": changes["deleted"],
+    }
 
 @app.get("/paper/{paper_id}")
 async def get_paper(paper_id: str):
     logger.info(f"Received request for paper details with ID: {paper_id}")
-    with db_lock:
-        paper = db.search(Paper.id == paper_id)
+    paper = await db_read(db.search, Paper.id == paper_id)
     if not paper:
         logger.warning(f"Paper with ID {paper_id} not found.")
         raise HTTPException(status_code=404, detail="Paper not found")
@@ -716,8 +824,7 @@ async def get_paper(paper_id: str):
 @app.get("/export-summary/{paper_id}")
 async def export_summary(paper_id: str):
     logger.info(f"Received request to export PDF for paper ID: {paper_id}")
-    with db_lock:
-        paper = db.search(Paper.id == paper_id)
+    paper = await db_read(db.search, Paper.id == paper_id)
     if not paper:
         logger.warning(f"Paper with ID {paper_id} not found for export.")
         raise HTTPException(status_code=404, detail="Paper not found")
@@ -727,12 +834,15 @@ async def export_summary(paper_id: str):
     model_name = MODEL_MAPPING.get(mode, MODEL_MAPPING["default"])
 
     try:
-        pdf_bytes = generate_pdf_content(record, author=model_name)
+        pdf_bytes = await pdf_renderer.render(record, model_name)
+    except PdfRenderTimeout as e:
+        logger.error(f"Timed out generating PDF for paper ID: {paper_id}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.exception("Failed to generate PDF content")
         raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {e}")
 
-    filename_hint = _derive_pdf_title(record) or f"{mode}_summary"
+    filename_hint = derive_pdf_title(record) or f"{mode}_summary"
     safe_filename = re.sub(r"[^A-Za-z0-9_.-]", "_", filename_hint).strip("_") or f"{mode}_summary"
 
     pdf_stream = io.BytesIO(pdf_bytes)
@@ -746,6 +856,22 @@ async def export_summary(paper_id: str):
     logger.info(f"Successfully generated PDF for paper ID: {paper_id}")
     return StreamingResponse(pdf_stream, media_type="application/pdf", headers=headers)
 
+@app.get("/admin/storage")
+async def storage_usage():
+    logger.info("Received request for storage usage.")
+    # Takes the storage lock and stats every stored file; keep it off the event loop
+    return await asyncio.to_thread(retention_manager.usage)
+
+@app.get("/admin/admission")
+async def admission_metrics():
+    logger.info("Received request for admission metrics.")
+    # Lane counters are per process: this reports only the worker that answered
+    return dict(admission.metrics(), workers=BACKEND_WORKERS)
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if BACKEND_WORKERS > 1:
+        # Multiple workers need an import string so each process loads its own app
+        uvicorn.run("main:app", host="0.0.0.0", port=BACKEND_PORT, workers=BACKEND_WORKERS, app_dir=str(BASE_DIR))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=BACKEND_PORT)
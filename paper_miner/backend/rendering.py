@@ -0,0 +1,466 @@
+import asyncio
+import copy
+import io
+import itertools
+import logging
+import multiprocessing
+import re
+import signal
+import threading
+from html import escape
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+REPO_URL = "https://github.com/nikilpatel94/vibe_coded_apps/tree/main/paper_miner"
+
+UNICODE_FONT_FAMILY = "DocFont"
+FALLBACK_FONT_FAMILY = "Helvetica"
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists", "nl2br"]
+# fpdf2's write_html slows down super-linearly with input length, so long
+# sections are written in chunks of whole top-level blocks of about this size
+HTML_CHUNK_CHARS = 2048
+
+_HTML_TAG = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)\b[^>]*?(/?)>")
+_VOID_TAGS = {"br", "hr", "img", "wbr", "col", "area", "embed", "source", "track", "input"}
+
+
+class PdfRenderTimeout(Exception):
+    pass
+
+
+class _PoolDiscarded(Exception):
+    """The pool a render was queued on was torn down because another render timed out."""
+
+
+# Times a render is resubmitted after its pool was restarted under it
+POOL_RESUBMIT_LIMIT = 2
+# Extra seconds a timed-out render gets to stop itself before its pool is torn down
+STUCK_RENDER_GRACE_SECONDS = 5
+
+
+def _stringify(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "\n\n".join(str(item) for item in value)
+    return str(value)
+
+
+def _safe_pdf_text(value: str) -> str:
+    return _stringify(value).encode("latin-1", "ignore").decode("latin-1")
+
+
+def _prepare_pdf_sections(record):
+    mode = record.get("mode", "scientific_paper")
+    sections = []
+
+    if mode == "scientific_paper":
+        sections.extend([
+            ("Authors", _stringify(record.get("authors", "Not Found"))),
+            ("Affiliated Institute", _stringify(record.get("affiliated_institute", "Not Found"))),
+            ("Version", _stringify(record.get("version", "Not Found"))),
+            ("Novelty", _stringify(record.get("novelty", "Not Found"))),
+            ("Contributions", _stringify(record.get("contributions", "Not Found"))),
+            ("Results", _stringify(record.get("results", "Not Found"))),
+            ("Limitations", _stringify(record.get("limitations", "Not Found"))),
+        ])
+    elif mode == "document":
+        sections.extend([
+            ("Important Insights", _stringify(record.get("important_insights", "Not Found"))),
+            ("Summary", _stringify(record.get("summary", "Not Found"))),
+        ])
+    elif mode == "legal_document":
+        sections.extend([
+            ("Benefits", _stringify(record.get("benefits", "Not Found"))),
+            ("Traps", _stringify(record.get("traps", "Not Found"))),
+            ("Advisability", _stringify(record.get("advisability", "Not Found"))),
+        ])
+    elif mode == "web":
+        sections.extend([
+            ("URL", _stringify(record.get("url", "Not Found"))),
+            ("Summary", _stringify(record.get("summary", "Not Found"))),
+            ("Takeaways", _stringify(record.get("takeaways", "Not Found"))),
+        ])
+    else:
+        for key, value in record.items():
+            if key in {"id", "pdf_path", "filename", "mode", "title"}:
+                continue
+            sections.append((key.replace("_", " ").title(), _stringify(value)))
+
+    filtered_sections = [(header, text) for header, text in sections if _stringify(text).strip()]
+    return filtered_sections or [("Summary", "No data available for this entry.")]
+
+
+def derive_pdf_title(record):
+    mode = record.get("mode", "scientific_paper")
+    default_titles = {
+        "scientific_paper": "Scientific Paper Summary",
+        "document": "Document Summary",
+        "legal_document": "Legal Document Summary",
+        "web": "Web Page Summary",
+    }
+    return _stringify(record.get("title")) or _stringify(record.get("filename")) or default_titles.get(mode, "Analysis Summary")
+
+
+# Per-process rendering state, built once by init_renderer() and then reused
+# for every document rendered by this process.
+_font_prototype = None
+_font_bytes = {}
+_local = threading.local()
+
+
+def init_renderer(regular_font_path=None, bold_font_path=None):
+    """Load fonts and the markdown stack for this process.
+
+    The TTF files are read and their metrics parsed once into a prototype
+    document whose font objects are copied into each new PDF. Subsetting
+    still happens per document, embedding only the glyphs used.
+    Without a usable regular font the renderer falls back to core Helvetica,
+    which only covers latin-1.
+    """
+    global _font_prototype, _font_bytes
+    from fpdf import FPDF
+
+    _font_prototype = None
+    _font_bytes = {}
+    if regular_font_path and Path(regular_font_path).is_file():
+        bold_font_path = bold_font_path if bold_font_path and Path(bold_font_path).is_file() else regular_font_path
+        # No italic faces are configured; emphasis reuses the upright ones
+        font_paths = {"": regular_font_path, "I": regular_font_path, "B": bold_font_path, "BI": bold_font_path}
+        prototype = FPDF()
+        for style, path in font_paths.items():
+            prototype.add_font(UNICODE_FONT_FAMILY, style, path)
+        for font in prototype.fonts.values():
+            if font.ttffile not in _font_bytes:
+                _font_bytes[font.ttffile] = Path(font.ttffile).read_bytes()
+        _font_prototype = prototype
+        logger.info(f"Loaded PDF font {regular_font_path}")
+    else:
+        logger.warning(f"Unicode PDF font not found at {regular_font_path}; falling back to latin-1 core fonts.")
+    _get_markdown_converter()
+
+
+def _get_markdown_converter():
+    converter = getattr(_local, "markdown", None)
+    if converter is None:
+        import markdown
+        converter = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+        _local.markdown = converter
+    return converter
+
+
+def _markdown_to_html(text):
+    return _get_markdown_converter().reset().convert(text)
+
+
+def _html_chunks(html, limit=HTML_CHUNK_CHARS):
+    """Split ``html`` between top-level elements into chunks of about ``limit`` characters."""
+    chunks = []
+    current = ""
+    depth = 0
+    start = 0
+    for match in _HTML_TAG.finditer(html):
+        closing, name, self_closing = match.group(1), match.group(2).lower(), match.group(3)
+        if name not in _VOID_TAGS and not self_closing:
+            depth += -1 if closing else 1
+        if depth > 0:
+            continue
+        current += html[start:match.end()]
+        start = match.end()
+        if len(current) >= limit:
+            chunks.append(current)
+            current = ""
+    current += html[start:]
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+_markdown_pdf_class = None
+
+
+def _get_markdown_pdf_class():
+    global _markdown_pdf_class
+    if _markdown_pdf_class is None:
+        from fpdf import FPDF, HTMLMixin
+
+        class MarkdownPDF(FPDF, HTMLMixin):
+            pass
+
+        _markdown_pdf_class = MarkdownPDF
+    return _markdown_pdf_class
+
+
+def _copy_prototype_fonts():
+    from fontTools import ttLib
+
+    fonts = copy.deepcopy(_font_prototype.fonts)
+    for font in fonts.values():
+        # fpdf2 shares the fontTools object between copies, but subsetting
+        # prunes it in place; give each document its own lazily loaded one
+        font.ttfont = ttLib.TTFont(io.BytesIO(_font_bytes[font.ttffile]), recalcTimestamp=False, lazy=True)
+    return fonts
+
+
+def _new_document():
+    pdf = _get_markdown_pdf_class()()
+    if _font_prototype is not None:
+        pdf.fonts.update(_copy_prototype_fonts())
+        return pdf, UNICODE_FONT_FAMILY, _stringify
+    return pdf, FALLBACK_FONT_FAMILY, _safe_pdf_text
+
+
+def generate_pdf_content(record, author):
+    pdf_title = derive_pdf_title(record)
+    sections = _prepare_pdf_sections(record)
+
+    pdf, family, clean = _new_document()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_title(pdf_title)
+    pdf.set_author(author)
+
+    pdf.set_font(family, "B", 18)
+    pdf.set_text_color(30, 30, 30)
+    pdf.multi_cell(0, 10, clean(pdf_title), align="C")
+    pdf.ln(5)
+
+    pdf.set_font(family, "I", 11)
+    pdf.set_text_color(90, 90, 90)
+    pdf.multi_cell(0, 8, clean(f"Generated by: {author}"), align="C")
+    pdf.ln(2)
+    pdf.set_font(family, "", 11)
+    pdf.set_text_color(60, 120, 200)
+    pdf.multi_cell(0, 8, clean("Project GitHub Repository"), align="C", link=REPO_URL)
+    pdf.ln(8)
+
+    pdf.set_text_color(40, 40, 40)
+
+    pdf.set_font(family, "", 12)
+    html_options = {}
+    if family == UNICODE_FONT_FAMILY:
+        from fpdf.fonts import TextStyle
+        # Code blocks default to core Courier, which cannot show non-latin text
+        code_style = TextStyle(font_family=family)
+        html_options = {"font_family": family, "tag_styles": {"pre": code_style, "code": code_style}}
+
+    for header, body in sections:
+        header_html = f"<h3>{escape(header)}</h3>"
+        body_html = _markdown_to_html(_stringify(body))
+        combined_html = header_html + body_html + "<br>"
+        for chunk in _html_chunks(combined_html):
+            pdf.write_html(clean(chunk), **html_options)
+        pdf.ln(2)
+
+    footer_html = (
+        f"<hr><p>Discover more at <a href=\"{REPO_URL}\">{REPO_URL}</a></p>"
+    )
+    pdf.write_html(clean(footer_html), **html_options)
+
+    raw = pdf.output(dest="S")
+    if isinstance(raw, str):
+        return raw.encode("latin-1", "ignore")
+    return bytes(raw)
+
+
+def _warm_up(_):
+    return True
+
+
+# Set in pool workers by _init_pool_worker(); renders report their start on it
+_start_queue = None
+
+
+def _init_pool_worker(start_queue, regular_font_path=None, bold_font_path=None):
+    global _start_queue
+    _start_queue = start_queue
+    init_renderer(regular_font_path, bold_font_path)
+
+
+def _raise_render_timeout(signum, frame):
+    raise PdfRenderTimeout("PDF rendering timed out")
+
+
+def _render_task(task_id, record, author, timeout):
+    """Render in a pool worker, stopping the render itself after ``timeout`` seconds."""
+    _start_queue.put(task_id)
+    use_alarm = bool(timeout) and hasattr(signal, "setitimer")
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_render_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return generate_pdf_content(record, author)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def _mark_started(started):
+    if not started.done():
+        started.set_result(None)
+
+
+def _fail_discarded(started, done):
+    if not started.done():
+        started.set_exception(_PoolDiscarded())
+    elif not done.done():
+        done.set_exception(_PoolDiscarded())
+
+
+class _PoolHandle:
+    def __init__(self, pool, starts):
+        self.pool = pool
+        self.starts = starts
+
+
+class PdfRenderer:
+    """Renders summaries to PDF in a warm pool of worker processes.
+
+    Each worker runs ``init_renderer`` once when the pool starts. The
+    ``timeout`` covers the render itself, not time spent queued behind other
+    renders: a worker stops a render that overruns it and raises
+    ``PdfRenderTimeout``, leaving the pool intact. Only a render that does
+    not stop within ``STUCK_RENDER_GRACE_SECONDS`` after that tears the pool
+    down; renders that were queued or running on it are resubmitted to a
+    fresh pool. With ``workers=0`` rendering happens in a thread of the
+    current process instead, where a timed-out render is abandoned rather
+    than stopped.
+    """
+
+    def __init__(self, workers, timeout, regular_font_path=None, bold_font_path=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.font_paths = (regular_font_path, bold_font_path)
+        self._pool = None
+        # Renders submitted to each pool: task id -> (loop, started, done)
+        self._pending = {}
+        self._task_ids = itertools.count()
+        self._in_process_ready = False
+        # _lock only guards the fields above and is never held while blocking;
+        # _start_lock serialises pool start-up, which runs in worker threads
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._start_lock:
+            with self._lock:
+                if self._pool is not None:
+                    return self._pool
+            ctx = multiprocessing.get_context("spawn")
+            starts = ctx.SimpleQueue()
+            pool = ctx.Pool(self.workers, initializer=_init_pool_worker, initargs=(starts, *self.font_paths))
+            # Block until every worker has loaded its fonts
+            pool.map(_warm_up, range(self.workers), chunksize=1)
+            handle = _PoolHandle(pool, starts)
+            threading.Thread(target=self._watch_starts, args=(handle,), daemon=True).start()
+            with self._lock:
+                self._pool = handle
+            logger.info(f"Started PDF render pool with {self.workers} worker(s)")
+            return handle
+
+    def _watch_starts(self, handle):
+        while True:
+            task_id = handle.starts.get()
+            if task_id is None:
+                return
+            with self._lock:
+                entry = self._pending.get(handle, {}).get(task_id)
+            if entry is not None:
+                loop, started, _ = entry
+                loop.call_soon_threadsafe(_mark_started, started)
+
+    def _render_in_process(self, record, author):
+        with self._lock:
+            ready = self._in_process_ready
+        if not ready:
+            with self._start_lock:
+                if not self._in_process_ready:
+                    init_renderer(*self.font_paths)
+                    self._in_process_ready = True
+        return generate_pdf_content(record, author)
+
+    async def render(self, record, author, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        if self.workers <= 0:
+            try:
+                return await asyncio.wait_for(
+                    asyncio.to_thread(self._render_in_process, record, author), timeout)
+            except asyncio.TimeoutError:
+                raise PdfRenderTimeout(f"PDF rendering timed out after {timeout} seconds")
+
+        for _ in range(POOL_RESUBMIT_LIMIT + 1):
+            try:
+                return await self._render_in_pool(record, author, timeout)
+            except _PoolDiscarded:
+                # Another render got stuck; this one was innocent, so it gets a fresh pool and timeout
+                logger.warning("PDF render pool restarted while an export was pending; resubmitting it.")
+        raise PdfRenderTimeout("PDF rendering was interrupted by repeated render pool restarts")
+
+    async def _render_in_pool(self, record, author, timeout):
+        handle = await asyncio.to_thread(self._get_pool)
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+        done = loop.create_future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            self._pending.setdefault(handle, {})[task_id] = (loop, started, done)
+
+        def _resolve(result):
+            _mark_started(started)
+            if not done.done():
+                done.set_result(result)
+
+        def _reject(error):
+            _mark_started(started)
+            if not done.done():
+                done.set_exception(error)
+
+        try:
+            handle.pool.apply_async(
+                _render_task,
+                (task_id, record, author, timeout),
+                callback=lambda result: loop.call_soon_threadsafe(_resolve, result),
+                error_callback=lambda error: loop.call_soon_threadsafe(_reject, error),
+            )
+            # Time queued behind other renders does not count against the timeout
+            await started
+            try:
+                return await asyncio.wait_for(done, timeout + STUCK_RENDER_GRACE_SECONDS)
+            except PdfRenderTimeout:
+                logger.error(f"PDF render exceeded {timeout}s and was stopped.")
+                raise PdfRenderTimeout(f"PDF rendering timed out after {timeout} seconds")
+            except asyncio.TimeoutError:
+                # The render is running but ignored its own deadline; free the worker
+                logger.error(f"PDF render did not stop after {timeout}s; restarting render pool.")
+                self._discard_pool(handle, task_id)
+                raise PdfRenderTimeout(f"PDF rendering timed out after {timeout} seconds")
+        finally:
+            with self._lock:
+                pending = self._pending.get(handle)
+                if pending is not None:
+                    pending.pop(task_id, None)
+                    if not pending and self._pool is not handle:
+                        del self._pending[handle]
+
+    def _discard_pool(self, handle, stuck_task_id):
+        with self._lock:
+            if self._pool is handle:
+                self._pool = None
+            others = self._pending.pop(handle, {})
+        others.pop(stuck_task_id, None)
+        # Terminating the pool drops every task on it without calling back;
+        # fail the other waiters now so they can resubmit instead of hanging
+        for loop, started, done in others.values():
+            loop.call_soon_threadsafe(_fail_discarded, started, done)
+        handle.starts.put(None)
+        threading.Thread(target=handle.pool.terminate, daemon=True).start()
+
+    def close(self):
+        with self._lock:
+            handle, self._pool = self._pool, None
+        if handle is not None:
+            handle.starts.put(None)
+            handle.pool.terminate()
+            handle.pool.join()
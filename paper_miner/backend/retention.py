@@ -0,0 +1,272 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from storage import InterProcessLock, remove_records, update_record
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
+
+def _env_number(name, cast):
+    value = os.environ.get(name, "").strip()
+    return cast(value) if value else None
+
+
+@dataclass
+class RetentionPolicy:
+    """Limits applied to one kind of stored data. ``None`` means unlimited."""
+
+    max_age_days: Optional[float] = None
+    max_bytes: Optional[int] = None
+    max_count: Optional[int] = None
+
+    @classmethod
+    def from_env(cls, prefix):
+        return cls(
+            max_age_days=_env_number(f"{prefix}_MAX_AGE_DAYS", float),
+            max_bytes=_env_number(f"{prefix}_MAX_BYTES", int),
+            max_count=_env_number(f"{prefix}_MAX_COUNT", int),
+        )
+
+    def select_expired(self, items, now):
+        """Return the keys of ``(key, created_at, size)`` items to delete.
+
+        Items older than ``max_age_days`` always go; after that the oldest
+        remaining items are dropped until both count and byte limits hold.
+        """
+        items = sorted(items, key=lambda item: item[1])
+        expired = []
+        kept = []
+        for key, created_at, size in items:
+            age_days = (now - created_at).total_seconds() / 86400
+            if self.max_age_days is not None and age_days > self.max_age_days:
+                expired.append(key)
+            else:
+                kept.append((key, size))
+
+        total_bytes = sum(size for _, size in kept)
+        while kept and (
+            (self.max_count is not None and len(kept) > self.max_count)
+            or (self.max_bytes is not None and total_bytes > self.max_bytes)
+        ):
+            key, size = kept.pop(0)
+            expired.append(key)
+            total_bytes -= size
+        return expired
+
+    def as_dict(self):
+        return {
+            "max_age_days": self.max_age_days,
+            "max_bytes": self.max_bytes,
+            "max_count": self.max_count,
+        }
+
+
+def _parse_created_at(record):
+    try:
+        created_at = datetime.fromisoformat(record.get("created_at", ""))
+    except (TypeError, ValueError):
+        # Entries from before created_at was stored are treated as the oldest
+        return _EPOCH
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at
+
+
+def _record_size(record):
+    return len(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+
+
+def _source_files(papers_dir):
+    if not papers_dir.is_dir():
+        return []
+    files = []
+    for path in papers_dir.iterdir():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if path.is_file():
+            files.append((path, stat))
+    return files
+
+
+def _unlink(path):
+    try:
+        Path(path).unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _unlink_all(paths):
+    return sum(_unlink(path) for path in paths)
+
+
+class RetentionManager:
+    """Applies retention policies to PAPERS_DIR and the analysis store.
+
+    ``run_once`` does the actual work in batches of ``batch_size`` deletions,
+    pausing ``batch_pause`` seconds between batches and running the file and
+    database work in a thread so request handling is never blocked for long.
+    Only one worker process sweeps at a time, guarded by ``lock_path``; the
+    result of the last sweep is kept next to it so every worker reports it.
+    """
+
+    def __init__(self, get_db, db_lock, papers_dir, db_path, lock_path,
+                 source_policy, analysis_policy, batch_size=50, batch_pause=0.05,
+                 orphan_grace_seconds=3600):
+        self.get_db = get_db
+        self.db_lock = db_lock
+        self.papers_dir = Path(papers_dir)
+        self.db_path = Path(db_path)
+        self.sweep_lock = InterProcessLock(lock_path)
+        self.state_path = Path(f"{lock_path}.state")
+        self.source_policy = source_policy
+        self.analysis_policy = analysis_policy
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = batch_pause
+        self.orphan_grace_seconds = orphan_grace_seconds
+
+    def _records(self):
+        with self.db_lock.shared():
+            return self.get_db().all()
+
+    def _remove_records(self, doc_ids):
+        with self.db_lock:
+            return remove_records(self.get_db(), doc_ids)
+
+    async def _in_batches(self, items, action):
+        done = 0
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            done += await asyncio.to_thread(action, batch)
+            await asyncio.sleep(self.batch_pause)
+        return done
+
+    async def run_once(self, now=None):
+        if not self.sweep_lock.acquire(blocking=False):
+            logger.info("Retention sweep already running in another worker; skipping.")
+            return None
+        try:
+            return await self._sweep(now or datetime.now(timezone.utc))
+        finally:
+            self.sweep_lock.release()
+
+    def _select_expired_analyses(self, now):
+        records = self._records()
+        expired_ids = set(self.analysis_policy.select_expired(
+            [(r.doc_id, _parse_created_at(r), _record_size(r)) for r in records], now))
+        expired_records = [r for r in records if r.doc_id in expired_ids]
+        # Source file name -> doc id of the surviving record that points to it
+        referenced = {
+            Path(r["pdf_path"]).name: r.doc_id for r in records
+            if r.get("pdf_path") and r.doc_id not in expired_ids
+        }
+        return expired_records, referenced
+
+    def _select_expired_files(self, now, referenced):
+        files = _source_files(self.papers_dir)
+        grace_cutoff = now.timestamp() - self.orphan_grace_seconds
+        orphans = [
+            path for path, stat in files
+            if path.name not in referenced and stat.st_mtime < grace_cutoff
+        ]
+        orphan_names = {path.name for path in orphans}
+        expired_sources = self.source_policy.select_expired(
+            [
+                (path, datetime.fromtimestamp(stat.st_mtime, timezone.utc), stat.st_size)
+                for path, stat in files if path.name not in orphan_names
+            ],
+            now,
+        )
+        return orphans, expired_sources
+
+    def _remove_sources(self, referenced, paths):
+        removed = _unlink_all(paths)
+        doc_ids = [referenced[path.name] for path in paths if path.name in referenced]
+        if doc_ids:
+            # The analyses stay, but must no longer point at a deleted file
+            with self.db_lock:
+                db = self.get_db()
+                for doc_id in doc_ids:
+                    update_record(db, doc_id, {"pdf_path": None})
+        return removed
+
+    async def _sweep(self, now):
+        started = time.monotonic()
+
+        # 1. Analyses past their retention are removed together with their source
+        expired_records, referenced = await asyncio.to_thread(self._select_expired_analyses, now)
+        removed_analyses = await self._in_batches(
+            [r.doc_id for r in expired_records], self._remove_records)
+        removed_sources = await self._in_batches(
+            [r["pdf_path"] for r in expired_records if r.get("pdf_path")], _unlink_all)
+
+        # 2. Source files past their retention, and files no record points to
+        orphans, expired_sources = await asyncio.to_thread(self._select_expired_files, now, referenced)
+        removed_orphans = await self._in_batches(orphans, _unlink_all)
+        removed_sources += await self._in_batches(
+            expired_sources, functools.partial(self._remove_sources, referenced))
+
+        last_run = {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "duration_seconds": round(time.monotonic() - started, 3),
+            "removed_analyses": removed_analyses,
+            "removed_sources": removed_sources,
+            "removed_orphans": removed_orphans,
+        }
+        await asyncio.to_thread(self._save_last_run, last_run)
+        logger.info(f"Retention sweep finished: {last_run}")
+        return last_run
+
+    def _save_last_run(self, last_run):
+        tmp_path = self.state_path.with_name(f"{self.state_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(last_run), encoding="utf-8")
+        os.replace(tmp_path, self.state_path)
+
+    def last_run(self):
+        """Return the result of the most recent sweep by any worker, or ``None``."""
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    async def run_forever(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Retention sweep failed")
+
+    def usage(self):
+        records = self._records()
+        files = _source_files(self.papers_dir)
+        referenced = {Path(r["pdf_path"]).name for r in records if r.get("pdf_path")}
+        return {
+            "sources": {
+                "directory": str(self.papers_dir),
+                "files": len(files),
+                "bytes": sum(stat.st_size for _, stat in files),
+                "orphaned_files": sum(1 for path, _ in files if path.name not in referenced),
+                "policy": self.source_policy.as_dict(),
+            },
+            "analyses": {
+                "path": str(self.db_path),
+                "records": len(records),
+                "bytes": sum(_record_size(r) for r in records),
+                "file_bytes": self.db_path.stat().st_size if self.db_path.exists() else 0,
+                "policy": self.analysis_policy.as_dict(),
+            },
+            "last_sweep": self.last_run(),
+        }
@@ -0,0 +1,146 @@
+import functools
+import logging
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SEPARATOR = "\n\n[...]\n\n"
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with we our "
+    "these those their not can also such than into using used use been if any e g i".split()
+)
+
+
+@dataclass(frozen=True)
+class FieldGroup:
+    """Schema fields answered together from the same retrieved chunks.
+
+    ``query`` is matched against the chunks; with ``include_lead`` the first
+    chunk (title page) is always part of the context.
+    """
+
+    fields: tuple
+    query: str
+    include_lead: bool = False
+
+
+def chunk_text(text, chunk_chars=1500, overlap_chars=200):
+    """Split ``text`` into chunks of about ``chunk_chars``, breaking at whitespace.
+
+    Consecutive chunks share about ``overlap_chars`` characters so a
+    sentence cut at a boundary is still whole in one of them.
+    """
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            # Prefer a paragraph break, then any whitespace, in the back half
+            cut = text.rfind("\n\n", start + chunk_chars // 2, end)
+            if cut == -1:
+                cut = max(text.rfind(ws, start + chunk_chars // 2, end) for ws in (" ", "\n"))
+            if cut != -1:
+                end = cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        next_start = max(start + 1, end - overlap_chars)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return [chunk for chunk in chunks if chunk]
+
+
+def _tokens(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def _normalise(vector):
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+
+class TfidfIndex:
+    """Sparse TF-IDF vectors with cosine similarity, in pure Python."""
+
+    name = "tfidf"
+
+    def __init__(self, chunks):
+        counts = [Counter(_tokens(chunk)) for chunk in chunks]
+        document_frequency = Counter(term for count in counts for term in count)
+        total = len(chunks)
+        self.idf = {
+            term: math.log((1 + total) / (1 + frequency)) + 1
+            for term, frequency in document_frequency.items()
+        }
+        self.vectors = [self._vector(count) for count in counts]
+
+    def _vector(self, counts):
+        return _normalise({
+            term: (1 + math.log(count)) * self.idf[term]
+            for term, count in counts.items() if term in self.idf
+        })
+
+    def search(self, query, k):
+        query_vector = self._vector(Counter(_tokens(query)))
+        scores = [
+            sum(weight * vector.get(term, 0.0) for term, weight in query_vector.items())
+            for vector in self.vectors
+        ]
+        return sorted(range(len(scores)), key=lambda i: (-scores[i], i))[:k]
+
+
+@functools.lru_cache(maxsize=None)
+def _load_embedding_model(model_name):
+    # Optional dependency, imported only when an embedding model is configured
+    from sentence_transformers import SentenceTransformer
+    logger.info(f"Loading embedding model {model_name} on CPU.")
+    return SentenceTransformer(model_name, device="cpu")
+
+
+class EmbeddingIndex:
+    """Dense index over a local sentence-transformers model running on CPU."""
+
+    name = "embedding"
+
+    def __init__(self, chunks, model_name):
+        self.model = _load_embedding_model(model_name)
+        self.vectors = self.model.encode(chunks, normalize_embeddings=True).tolist()
+
+    def search(self, query, k):
+        query_vector = self.model.encode([query], normalize_embeddings=True)[0].tolist()
+        scores = [sum(a * b for a, b in zip(query_vector, vector)) for vector in self.vectors]
+        return sorted(range(len(scores)), key=lambda i: (-scores[i], i))[:k]
+
+
+def build_index(chunks, embedding_model=None):
+    if embedding_model:
+        try:
+            return EmbeddingIndex(chunks, embedding_model)
+        except ImportError:
+            logger.warning("sentence-transformers is not installed; falling back to TF-IDF retrieval.")
+    return TfidfIndex(chunks)
+
+
+def retrieve_contexts(text, groups, top_k=4, chunk_chars=1500, overlap_chars=200, embedding_model=None):
+    """Return ``{group: excerpt}`` with the ``top_k`` chunks most relevant to each group.
+
+    Chunks are put back in document order and joined with ``CHUNK_SEPARATOR``.
+    """
+    chunks = chunk_text(text, chunk_chars, overlap_chars)
+    if not chunks:
+        return {group: "" for group in groups}
+    index = build_index(chunks, embedding_model)
+    contexts = {}
+    for group in groups:
+        selected = set(index.search(group.query, top_k))
+        if group.include_lead:
+            selected.add(0)
+        contexts[group] = CHUNK_SEPARATOR.join(chunks[i] for i in sorted(selected))
+    logger.info(f"Retrieved {top_k} of {len(chunks)} chunks per field group with {index.name} index.")
+    return contexts
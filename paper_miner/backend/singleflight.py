@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; cross-process claims are skipped
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same result, including any exception it raises.
+    Nothing is cached: once the work finishes the key is forgotten and the
+    next call starts afresh.
+
+    A caller that is cancelled (e.g. the client disconnected) stops waiting
+    without disturbing the others. The shared work itself is only cancelled
+    when every caller waiting on it has gone.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def is_running(self, key):
+        return key in self._calls
+
+    async def do(self, key, work):
+        """Return the result of ``await work()``, sharing it with concurrent callers."""
+        call = self._calls.get(key)
+        if call is None:
+            call = {"task": asyncio.ensure_future(work()), "waiters": 0}
+            self._calls[key] = call
+            call["task"].add_done_callback(lambda task: self._forget(key, call, task))
+        else:
+            logger.info(f"Joining in-flight call for key {key}")
+
+        call["waiters"] += 1
+        try:
+            return await asyncio.shield(call["task"])
+        except asyncio.CancelledError:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                logger.info(f"All callers for key {key} cancelled; cancelling shared work")
+                # Forget the call first so a newcomer starts fresh work instead
+                # of joining one that is being torn down
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call["task"].cancel()
+            raise
+
+    def _forget(self, key, call, task):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark any exception as retrieved even if every waiter has left
+            task.exception()
+
+
+class FileClaims:
+    """Coalesces identical work across worker processes through claim files.
+
+    A process runs the work for a key only while holding an exclusive
+    ``flock`` on ``<digest>.lock`` in ``directory``, and leaves the JSON
+    result in ``<digest>.json``. Processes that were waiting for the claim
+    find that result and return it instead of repeating the work. Only a
+    result finished after the caller started waiting is reused, so like
+    ``SingleFlight`` this coalesces concurrent calls rather than caching;
+    result files are deleted once older than ``ttl`` seconds. If the work
+    fails, the next waiter runs it itself.
+    """
+
+    def __init__(self, directory, ttl=30, poll_interval=0.05):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+    async def run(self, key, work):
+        """Return ``await work()``, or the result another process just produced for ``key``."""
+        if fcntl is None:
+            return await work()
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        lock_path = self.directory / f"{digest}.lock"
+        result_path = self.directory / f"{digest}.json"
+
+        waiting_since = time.time()
+        fd = await self._claim(lock_path)
+        try:
+            result = self._load(result_path, waiting_since)
+            if result is not None:
+                logger.info(f"Reusing result of another worker for key {key}")
+                return result["value"]
+            value = await work()
+            self._store(result_path, value)
+            return value
+        finally:
+            self._release(lock_path, fd)
+
+    async def _claim(self, lock_path):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        while True:
+            fd = os.open(str(lock_path), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                # Polling keeps the event loop free and makes waiting cancellable
+                await asyncio.sleep(self.poll_interval)
+                continue
+            # The holder before us unlinks the file on release; only a lock
+            # on the file currently at lock_path counts
+            try:
+                if os.fstat(fd).st_ino == os.stat(lock_path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _release(self, lock_path, fd):
+        try:
+            lock_path.unlink()
+        except FileNotFoundError:
+            pass
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _load(self, result_path, finished_after):
+        try:
+            result = json.loads(result_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        # A result from before this caller arrived belongs to an earlier request
+        return result if result.get("finished_at", 0) >= finished_after else None
+
+    def _store(self, result_path, value):
+        now = time.time()
+        for stale in self.directory.glob("*.json"):
+            try:
+                if now - stale.stat().st_mtime > self.ttl:
+                    stale.unlink()
+            except OSError:
+                pass
+        tmp_path = result_path.with_name(f"{result_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({"value": value, "finished_at": now}), encoding="utf-8")
+        os.replace(tmp_path, result_path)
@@ -0,0 +1,202 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; fall back to in-process locking only
+    fcntl = None
+
+
+class InterProcessLock:
+    """Re-entrant reader/writer lock held across threads *and* worker processes.
+
+    Writers take an exclusive ``flock`` on ``lock_path`` and readers, via
+    ``shared()``, a shared one, so uvicorn workers read concurrently and only
+    writes serialise them. Inside one process a thread lock still admits one
+    holder at a time: TinyDB reads through a single file handle, and parsing
+    JSON gains nothing from extra threads under the GIL. ``on_acquire`` runs
+    every time the outermost lock is taken, which lets the caller drop state
+    another process may have invalidated. A thread holding the shared lock
+    cannot upgrade to the exclusive one.
+    """
+
+    def __init__(self, lock_path, on_acquire=None):
+        self.lock_path = Path(lock_path)
+        self.on_acquire = on_acquire
+        self._thread_lock = threading.RLock()
+        self._local = threading.local()
+        self._fd = None
+
+    def _depth(self):
+        return getattr(self._local, "depth", 0)
+
+    def acquire(self, blocking=True, shared=False):
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._depth() == 0:
+            try:
+                if not self._acquire_file(blocking, shared):
+                    self._thread_lock.release()
+                    return False
+                if self.on_acquire is not None:
+                    self.on_acquire()
+            except BaseException:
+                self._release_file()
+                self._thread_lock.release()
+                raise
+            self._local.shared = shared
+        elif self._local.shared and not shared:
+            self._thread_lock.release()
+            raise RuntimeError("cannot upgrade a shared InterProcessLock to exclusive")
+        self._local.depth = self._depth() + 1
+        return True
+
+    def release(self):
+        depth = self._depth() - 1
+        if depth < 0:
+            raise RuntimeError("release() called on an unheld InterProcessLock")
+        self._local.depth = depth
+        if depth == 0:
+            self._release_file()
+        self._thread_lock.release()
+
+    def _acquire_file(self, blocking, shared):
+        if fcntl is None:
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.lock_path), os.O_RDWR | os.O_CREAT, 0o644)
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def _release_file(self):
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    @contextmanager
+    def shared(self):
+        """Hold the lock for reading; other processes may read at the same time."""
+        self.acquire(shared=True)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def refresh_tinydb(db):
+    """Forget everything TinyDB memoised about the file on disk.
+
+    TinyDB caches query results and the next document id per table. Both go
+    stale as soon as another worker writes to the same ``db.json``, so they
+    are cleared whenever the storage lock is (re)acquired.
+    """
+    tables = getattr(db, "_tables", None)
+    if not isinstance(tables, dict):
+        return
+    for table in tables.values():
+        table.clear_cache()
+        table._next_id = None
+
+
+# Change tracking for incremental history sync. Every write to the analysis
+# table goes through insert_record()/remove_records(), which stamp records
+# with a store-wide, monotonically increasing sequence number and keep
+# tombstones for deletions. All helpers must be called with db_lock held.
+META_TABLE = "_meta"
+DELETED_TABLE = "_deleted"
+MAX_TOMBSTONES = 1000
+
+
+def _meta(db):
+    meta = db.table(META_TABLE).get(doc_id=1)
+    if not meta:
+        return {"seq": 0, "pruned_through": 0}
+    return {"seq": int(meta["seq"]), "pruned_through": int(meta["pruned_through"])}
+
+
+def current_change_seq(db):
+    return _meta(db)["seq"]
+
+
+def _advance_seq(db):
+    meta_table = db.table(META_TABLE)
+    meta = _meta(db)
+    meta["seq"] += 1
+    if meta_table.get(doc_id=1):
+        meta_table.update(meta, doc_ids=[1])
+    else:
+        meta_table.insert(meta)
+    return meta["seq"]
+
+
+def insert_record(db, record):
+    seq = _advance_seq(db)
+    record = dict(record, seq=seq, created_seq=seq)
+    db.insert(record)
+    return record
+
+
+def update_record(db, doc_id, fields):
+    db.update(dict(fields, seq=_advance_seq(db)), doc_ids=[doc_id])
+
+
+def remove_records(db, doc_ids, max_tombstones=MAX_TOMBSTONES):
+    """Delete records by TinyDB doc id, leaving tombstones for sync clients."""
+    removed = [doc for doc in (db.get(doc_id=doc_id) for doc_id in doc_ids) if doc]
+    if not removed:
+        return 0
+    db.remove(doc_ids=[doc.doc_id for doc in removed])
+    seq = _advance_seq(db)
+    deleted = db.table(DELETED_TABLE)
+    deleted.insert_multiple({"id": doc.get("id"), "seq": seq} for doc in removed)
+
+    tombstones = deleted.all()
+    if len(tombstones) > max_tombstones:
+        # Clients older than the newest pruned tombstone must resync fully
+        tombstones.sort(key=lambda tombstone: tombstone["seq"])
+        pruned = tombstones[:len(tombstones) - max_tombstones]
+        deleted.remove(doc_ids=[tombstone.doc_id for tombstone in pruned])
+        meta_table = db.table(META_TABLE)
+        meta_table.update({"pruned_through": pruned[-1]["seq"]}, doc_ids=[1])
+    return len(removed)
+
+
+def changes_since(db, since):
+    """Return records and deleted ids changed after sequence number ``since``.
+
+    A ``reset`` result carries every record: the client is new, is older
+    than the retained tombstones, or holds a sequence this store never issued.
+    """
+    meta = _meta(db)
+    records = db.all()
+    if since <= 0 or since < meta["pruned_through"] or since > meta["seq"]:
+        return {"seq": meta["seq"], "reset": True, "added": records, "updated": [], "deleted": []}
+
+    added = [r for r in records if r.get("created_seq", 0) > since]
+    updated = [r for r in records if r.get("seq", 0) > since >= r.get("created_seq", 0)]
+    deleted = [t["id"] for t in db.table(DELETED_TABLE).all() if t["seq"] > since]
+    return {"seq": meta["seq"], "reset": False, "added": added, "updated": updated, "deleted": deleted}
@@ -0,0 +1,56 @@
+"""Fixture papers for retrieval mode, shared by the tests and the fidelity benchmark.
+
+Standard library only: importing it never loads the app or its settings.
+"""
+import json
+from pathlib import Path
+
+FIXTURES_PATH = Path(__file__).resolve().parent / "fixtures" / "retrieval_papers.json"
+
+
+def build_paper_text(paper, min_chars):
+    """Lay out a fixture paper, padding the middle to at least ``min_chars``."""
+    sections = [paper["front_matter"]]
+    for heading, paragraphs in paper["sections"]:
+        sections.append("\n\n".join([heading, *paragraphs]))
+    body_length = sum(len(section) + 2 for section in sections)
+    padding = []
+    n = 0
+    while body_length + sum(len(p) + 2 for p in padding) < min_chars:
+        paragraph = paper["appendix"][n % len(paper["appendix"])]
+        padding.append(f"3.{n + 1} Implementation detail\n\n{paragraph}")
+        n += 1
+    # Padding goes after the method section so results and limitations sit deep in the text
+    return "\n\n".join(sections[:4] + padding + sections[4:])
+
+
+def load_fixtures(min_chars, path=FIXTURES_PATH):
+    papers = json.loads(Path(path).read_text(encoding="utf-8"))
+    return [(paper, build_paper_text(paper, min_chars)) for paper in papers]
+
+
+def _squash(text):
+    return " ".join(text.split())
+
+
+def evidence_recall(paper, contexts):
+    """Return ``{field: bool}``: whether the field's gold evidence was retrieved."""
+    found = {}
+    for group, context in contexts.items():
+        for field in group.fields:
+            found[field] = _squash(paper["evidence"][field]) in _squash(context)
+    return found
+
+
+def prompt_sizes(text, contexts, build_prompt, fields, estimate_tokens):
+    """Return estimated prompt tokens for the full-text and retrieval paths.
+
+    ``build_prompt(text, fields)`` renders one prompt; ``fields`` is the
+    complete schema, from which each group's subset is taken.
+    """
+    full = estimate_tokens(build_prompt(text, fields))
+    retrieval = sum(
+        estimate_tokens(build_prompt(context, {field: fields[field] for field in group.fields}))
+        for group, context in contexts.items()
+    )
+    return full, retrieval
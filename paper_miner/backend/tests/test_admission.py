@@ -0,0 +1,106 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from admission import AdmissionController, AdmissionRejected, Lane
+
+
+def _controller():
+    return AdmissionController([
+        Lane("large", max_tokens=None, concurrency=1, max_queue=2),
+        Lane("small", max_tokens=100, concurrency=2, max_queue=2),
+    ])
+
+
+def test_classify_picks_smallest_fitting_lane():
+    controller = _controller()
+    assert controller.classify(10).name == "small"
+    assert controller.classify(100).name == "small"
+    assert controller.classify(101).name == "large"
+
+
+def test_small_requests_do_not_wait_behind_large_ones():
+    async def scenario():
+        controller = _controller()
+        finished = []
+
+        async def job(name, tokens, seconds):
+            async with controller.admit(tokens):
+                await asyncio.sleep(seconds)
+            finished.append(name)
+
+        await asyncio.gather(
+            job("large-1", 10_000, 0.2), job("large-2", 10_000, 0.2), job("small", 10, 0.01))
+        return finished, controller.metrics()["lanes"]
+
+    finished, lanes = asyncio.run(scenario())
+
+    assert finished == ["small", "large-1", "large-2"]
+    assert lanes["large"]["admitted"] == 2
+    assert lanes["large"]["wait_seconds"]["max"] >= 0.15
+    assert lanes["small"]["wait_seconds"]["max"] < 0.1
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        controller = _controller()
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit(10_000):
+                await release.wait()
+
+        holders = [asyncio.create_task(hold()) for _ in range(3)]
+        await asyncio.sleep(0)
+        depth = controller.metrics()["lanes"]["large"]["queue_depth"]
+        with pytest.raises(AdmissionRejected) as excinfo:
+            async with controller.admit(10_000):
+                pass
+        release.set()
+        await asyncio.gather(*holders)
+        return depth, excinfo.value, controller.metrics()["lanes"]["large"]
+
+    depth, error, lane = asyncio.run(scenario())
+
+    assert depth == 2
+    assert error.lane == "large"
+    assert error.retry_after == 5
+    assert (lane["active"], lane["queue_depth"], lane["admitted"], lane["rejected"]) == (0, 0, 3, 1)
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = _controller()
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit(10_000):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        depth = controller.metrics()["lanes"]["large"]["queue_depth"]
+        release.set()
+        await holder
+        return depth, controller.metrics()["lanes"]["large"]
+
+    depth, lane = asyncio.run(scenario())
+
+    assert depth == 0
+    assert (lane["active"], lane["admitted"]) == (0, 1)
+
+
+def test_per_worker_splits_limits_but_keeps_one_slot():
+    lane = Lane("small", max_tokens=100, concurrency=4, max_queue=16)
+
+    assert lane.per_worker(1) == lane
+    assert (lane.per_worker(2).concurrency, lane.per_worker(2).max_queue) == (2, 8)
+    assert (lane.per_worker(8).concurrency, lane.per_worker(8).max_queue) == (1, 2)
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm import GeminiProvider, LLMProvider, LocalProvider, create_provider
+
+FIELDS = {"summary": "Provide a summary.", "takeaways": "List the takeaways."}
+
+
+def test_local_provider_returns_deterministic_schema_valid_json():
+    provider = LocalProvider()
+
+    first = provider.generate("gemini-2.5-flash", "prompt text", FIELDS)
+    second = provider.generate("gemini-2.5-flash", "prompt text", FIELDS)
+    other = provider.generate("gemini-2.5-flash", "another prompt", FIELDS)
+
+    assert first == second
+    assert first != other
+    assert set(json.loads(first)) == set(FIELDS)
+
+
+def test_local_provider_latency_is_configurable():
+    provider = LocalProvider(latency=0.05)
+
+    start = time.perf_counter()
+    provider.generate("model", "prompt", FIELDS)
+
+    assert time.perf_counter() - start >= 0.05
+
+
+@patch('google.generativeai.configure')
+@patch('google.generativeai.GenerativeModel')
+def test_gemini_provider_reuses_one_client_per_model(mock_model_cls, mock_configure):
+    mock_model_cls.return_value.generate_content.return_value.text = '{"summary": "ok"}'
+    provider = GeminiProvider(api_key="test-key")
+
+    for _ in range(3):
+        assert provider.generate("gemini-2.5-flash", "prompt", FIELDS) == '{"summary": "ok"}'
+    provider.generate("gemini-2.5-pro", "prompt", FIELDS)
+
+    mock_configure.assert_called_once_with(api_key="test-key")
+    assert [call.args[0] for call in mock_model_cls.call_args_list] == ["gemini-2.5-flash", "gemini-2.5-pro"]
+
+
+def test_create_provider_by_name(monkeypatch):
+    monkeypatch.setenv("LOCAL_LLM_LATENCY_SECONDS", "0.25")
+
+    assert isinstance(create_provider("gemini"), GeminiProvider)
+    assert create_provider("local").latency == 0.25
+    with pytest.raises(ValueError):
+        create_provider("unknown")
+
+
+def test_provider_without_generate_cannot_be_created():
+    class Incomplete(LLMProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -1,36 +1,44 @@
 
+import asyncio
 import os
 import sys
 import tempfile
+import time
 from pathlib import Path
 import pytest
+import httpx
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 
 # Add the backend directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from main import app
+from llm import LocalProvider
+from rendering import PdfRenderTimeout
+from admission import AdmissionController, Lane
 
 @pytest.fixture
 def client():
-    return TestClient(app)
+    # Entering the client runs the app's startup/shutdown lifecycle hooks
+    with TestClient(app) as test_client:
+        yield test_client
 
 def test_read_main(client):
     response = client.get("/history")
     assert response.status_code == 200
 
-@patch('main.PdfReader')
-@patch('main.genai.GenerativeModel')
+@patch('main.get_pdf_reader')
+@patch('main.get_llm_provider')
 @patch('main.db')
-def test_upload_pdf_scientific_paper(mock_db, mock_genai, mock_pdf_reader, client, monkeypatch):
+def test_upload_pdf_scientific_paper(mock_db, mock_llm, mock_pdf_reader, client, monkeypatch):
     # Mock the PdfReader
     mock_pdf_page = MagicMock()
     mock_pdf_page.extract_text.return_value = "This is a test pdf."
-    mock_pdf_reader.return_value.pages = [mock_pdf_page]
+    mock_pdf_reader.return_value.return_value.pages = [mock_pdf_page]
 
     # Mock the Gemini API response
-    mock_genai.return_value.generate_content.return_value.text = '''
+    mock_llm.return_value.generate.return_value = '''
     {
         "title": "Test Paper",
         "authors": "Test Author",
@@ -56,17 +64,17 @@ def test_upload_pdf_scientific_paper(mock_db, mock_genai, mock_pdf_reader, clien
     assert response.json()["title"] == "Test Paper"
     mock_db.insert.assert_called_once()
 
-@patch('main.PdfReader')
-@patch('main.genai.GenerativeModel')
+@patch('main.get_pdf_reader')
+@patch('main.get_llm_provider')
 @patch('main.db')
-def test_upload_pdf_document(mock_db, mock_genai, mock_pdf_reader, client, monkeypatch):
+def test_upload_pdf_document(mock_db, mock_llm, mock_pdf_reader, client, monkeypatch):
     # Mock the PdfReader
     mock_pdf_page = MagicMock()
     mock_pdf_page.extract_text.return_value = "This is a test pdf."
-    mock_pdf_reader.return_value.pages = [mock_pdf_page]
+    mock_pdf_reader.return_value.return_value.pages = [mock_pdf_page]
     
     # Mock the Gemini API response
-    mock_genai.return_value.generate_content.return_value.text = '''
+    mock_llm.return_value.generate.return_value = '''
     {
         "important_insights": "Test Insights",
         "summary": "Test Summary"
@@ -87,9 +95,9 @@ def test_upload_pdf_document(mock_db, mock_genai, mock_pdf_reader, client, monke
     mock_db.insert.assert_called_once()
 
 
-@patch('main.generate_pdf_content', return_value=b"%PDF-1.4")
+@patch('main.pdf_renderer.render', new_callable=AsyncMock, return_value=b"%PDF-1.4")
 @patch('main.db')
-def test_export_summary_success(mock_db, mock_generate_pdf_content, client):
+def test_export_summary_success(mock_db, mock_render, client):
     mock_db.search.return_value = [{
         "id": "paper-123",
         "mode": "scientific_paper",
@@ -106,7 +114,17 @@ def test_export_summary_success(mock_db, mock_generate_pdf_content, client):
     assert response.status_code == 200
     assert response.headers["content-type"] == "application/pdf"
     assert response.headers["x-model-author"] == "gemini-2.5-flash"
-    mock_generate_pdf_content.assert_called_once()
+    mock_render.assert_awaited_once()
+
+
+@patch('main.pdf_renderer.render', new_callable=AsyncMock, side_effect=PdfRenderTimeout("PDF rendering timed out after 30 seconds"))
+@patch('main.db')
+def test_export_summary_timeout(mock_db, mock_render, client):
+    mock_db.search.return_value = [{"id": "paper-123", "mode": "document", "summary": "Summary"}]
+
+    response = client.get("/export-summary/paper-123")
+
+    assert response.status_code == 504
 
 
 @patch('main.db')
@@ -117,3 +135,176 @@ def test_export_summary_not_found(mock_db, client):
 
     assert response.status_code == 404
     assert response.json()["detail"] == "Paper not found"
+
+
+def test_admin_storage_reports_usage(client):
+    response = client.get("/admin/storage")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"sources", "analyses", "last_sweep"}
+    assert "records" in body["analyses"]
+    assert "bytes" in body["sources"]
+
+
+@patch('main.get_pdf_reader')
+@patch('main.get_llm_provider')
+@patch('main.db')
+def test_concurrent_identical_uploads_make_one_model_call(mock_db, mock_llm, mock_pdf_reader, tmp_path, monkeypatch):
+    monkeypatch.setattr("main.PAPERS_DIR", tmp_path)
+    mock_pdf_page = MagicMock()
+    mock_pdf_page.extract_text.return_value = "This is a trending paper."
+    mock_pdf_reader.return_value.return_value.pages = [mock_pdf_page]
+
+    def slow_generate(model_name, prompt, fields):
+        time.sleep(0.2)
+        return '{"important_insights": "Shared Insights", "summary": "Shared Summary"}'
+
+    generate = mock_llm.return_value.generate
+    generate.side_effect = slow_generate
+
+    async def fire(count):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.post(
+                    "/upload-pdf/",
+                    files={"file": ("trending.pdf", b"same pdf bytes", "application/pdf")},
+                    data={"mode": "document"},
+                )
+                for _ in range(count)
+            ))
+
+    responses = asyncio.run(fire(5))
+
+    assert [response.status_code for response in responses] == [200] * 5
+    assert all(response.json()["important_insights"] == "Shared Insights" for response in responses)
+    assert len({response.json()["id"] for response in responses}) == 5
+    assert generate.call_count == 1
+    assert mock_pdf_reader.return_value.call_count == 1
+    assert mock_db.insert.call_count == 5
+
+
+@patch('main.get_llm_provider', return_value=LocalProvider())
+@patch('main.db')
+def test_upload_text_with_local_provider(mock_db, mock_llm, client):
+    response = client.post("/upload-text/", json={"text": "The provider may change fees at any time.", "mode": "legal_document"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert {"benefits", "traps", "advisability"} <= set(body)
+    assert all(body[field] != "Not Found" for field in ("benefits", "traps", "advisability"))
+    mock_db.insert.assert_called_once()
+
+
+def test_history_etag_and_changes(tmp_path, client):
+    from tinydb import TinyDB
+    db = TinyDB(str(tmp_path / "db.json"))
+    with patch('main.db', db), patch('main.get_llm_provider', return_value=LocalProvider()):
+        first = client.get("/history")
+        etag = first.headers["etag"]
+        assert client.get("/history", headers={"If-None-Match": etag}).status_code == 304
+
+        client.post("/upload-text/", json={"text": "Fees may change.", "mode": "legal_document"})
+        second = client.get("/history", headers={"If-None-Match": etag})
+        assert second.status_code == 200
+        assert second.headers["etag"] != etag
+
+        changes = client.get("/history/changes", params={"since": 0}).json()
+        assert changes["reset"] is True
+        assert [entry["mode"] for entry in changes["added"]] == ["legal_document"]
+
+        assert client.get("/history/changes", params={"since": changes["seq"]}).json() == {
+            "seq": changes["seq"], "reset": False, "added": [], "updated": [], "deleted": []}
+    db.close()
+
+
+@patch('main.get_llm_provider', return_value=LocalProvider(latency=0.3))
+@patch('main.db')
+def test_full_lane_sheds_load_with_retry_after(mock_db, mock_llm, monkeypatch):
+    controller = AdmissionController([Lane("small", max_tokens=None, concurrency=1, max_queue=1)])
+    monkeypatch.setattr("main.admission", controller)
+
+    async def fire(count):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.post("/upload-text/", json={"text": f"Contract {i}", "mode": "legal_document"})
+                for i in range(count)
+            ))
+
+    responses = asyncio.run(fire(4))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 503, 503]
+    rejected = [response for response in responses if response.status_code == 503]
+    assert all(int(response.headers["retry-after"]) >= 1 for response in rejected)
+    lane = controller.metrics()["lanes"]["small"]
+    assert (lane["admitted"], lane["rejected"], lane["queue_depth"], lane["active"]) == (2, 2, 0, 0)
+
+
+@patch('main.get_pdf_reader')
+def test_shed_pdf_upload_is_not_saved(mock_pdf_reader, client, tmp_path, monkeypatch):
+    monkeypatch.setattr("main.PAPERS_DIR", tmp_path)
+    controller = AdmissionController([Lane("large", max_tokens=None, concurrency=1, max_queue=1)])
+    state = controller._states["large"]
+    state.active = 1
+    state.waiters.append(object())
+    monkeypatch.setattr("main.admission", controller)
+
+    response = client.post(
+        "/upload-pdf/",
+        files={"file": ("busy.pdf", b"pdf bytes", "application/pdf")},
+        data={"mode": "document"},
+    )
+
+    assert response.status_code == 503
+    assert "retry-after" in response.headers
+    assert list(tmp_path.iterdir()) == []
+    mock_pdf_reader.assert_not_called()
+
+
+@patch('main.get_pdf_reader')
+@patch('main.get_llm_provider')
+@patch('main.db')
+def test_identical_upload_joins_in_flight_analysis_when_lane_is_full(mock_db, mock_llm, mock_pdf_reader, tmp_path, monkeypatch):
+    monkeypatch.setattr("main.PAPERS_DIR", tmp_path)
+    # No queue: the lane is full as soon as one analysis runs
+    controller = AdmissionController([Lane("large", max_tokens=None, concurrency=1, max_queue=0)])
+    monkeypatch.setattr("main.admission", controller)
+    mock_pdf_page = MagicMock()
+    mock_pdf_page.extract_text.return_value = "This is a trending paper."
+    mock_pdf_reader.return_value.return_value.pages = [mock_pdf_page]
+
+    def slow_generate(model_name, prompt, fields):
+        time.sleep(0.3)
+        return '{"important_insights": "Shared Insights", "summary": "Shared Summary"}'
+
+    mock_llm.return_value.generate.side_effect = slow_generate
+
+    async def fire():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            def upload(content):
+                return async_client.post(
+                    "/upload-pdf/",
+                    files={"file": ("trending.pdf", content, "application/pdf")},
+                    data={"mode": "document"},
+                )
+            first = asyncio.ensure_future(upload(b"same pdf bytes"))
+            await asyncio.sleep(0.1)
+            later = await asyncio.gather(upload(b"same pdf bytes"), upload(b"other pdf bytes"))
+            return [await first, *later]
+
+    responses = asyncio.run(fire())
+
+    assert [response.status_code for response in responses] == [200, 200, 503]
+    assert mock_llm.return_value.generate.call_count == 1
+    assert controller.metrics()["lanes"]["large"]["rejected"] == 1
+
+
+def test_admission_metrics_endpoint(client):
+    response = client.get("/admin/admission")
+    assert response.status_code == 200
+    assert response.json()["pid"] == os.getpid()
+    assert set(response.json()["lanes"]) == {"small", "medium", "large"}
@@ -0,0 +1,150 @@
+import asyncio
+import io
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from pypdf import PdfReader
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rendering import PdfRenderer, PdfRenderTimeout, _html_chunks, generate_pdf_content, init_renderer
+
+FONT_DIR = Path("/usr/share/fonts/truetype/dejavu")
+REGULAR_FONT = FONT_DIR / "DejaVuSans.ttf"
+BOLD_FONT = FONT_DIR / "DejaVuSans-Bold.ttf"
+needs_font = pytest.mark.skipif(not REGULAR_FONT.is_file(), reason="DejaVu fonts not installed")
+
+UNICODE_RECORD = {
+    "id": "paper-1",
+    "mode": "document",
+    "title": "Résumé — Обзор",
+    "important_insights": "- **Привет** мир\n- Ελληνικά *κείμενο*",
+    "summary": "Zusammenfassung: Größe, Übung, naïve café.",
+}
+
+
+def _pdf_text(pdf_bytes):
+    return "".join(page.extract_text() for page in PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+
+@needs_font
+def test_unicode_font_keeps_non_latin_text():
+    init_renderer(str(REGULAR_FONT), str(BOLD_FONT))
+
+    text = _pdf_text(generate_pdf_content(UNICODE_RECORD, author="gemini-2.5-flash"))
+
+    assert "Привет" in text
+    assert "Ελληνικά" in text
+    assert "Größe" in text
+
+
+@needs_font
+def test_font_files_are_loaded_once_per_process(monkeypatch):
+    from fpdf import fonts
+
+    init_renderer(str(REGULAR_FONT), str(BOLD_FONT))
+    calls = []
+    real_ttfont = fonts.ttLib.TTFont
+    monkeypatch.setattr(fonts.ttLib, "TTFont", lambda *args, **kwargs: calls.append(args) or real_ttfont(*args, **kwargs))
+
+    for _ in range(3):
+        generate_pdf_content(UNICODE_RECORD, author="gemini-2.5-flash")
+
+    # Documents only wrap the cached font bytes; no font file is opened again
+    assert calls
+    assert all(isinstance(args[0], io.BytesIO) for args in calls)
+
+
+def test_missing_font_falls_back_to_latin1_core_font(tmp_path):
+    init_renderer(str(tmp_path / "missing.ttf"))
+
+    text = _pdf_text(generate_pdf_content(UNICODE_RECORD, author="gemini-2.5-flash"))
+
+    assert "Größe" in text
+    assert "Привет" not in text
+
+
+@needs_font
+def test_pool_renders_and_recovers_after_timeout():
+    async def scenario():
+        renderer = PdfRenderer(workers=1, timeout=30, regular_font_path=str(REGULAR_FONT), bold_font_path=str(BOLD_FONT))
+        try:
+            first = await renderer.render(UNICODE_RECORD, "gemini-2.5-flash")
+
+            renderer.timeout = 0.01
+            huge = dict(UNICODE_RECORD, summary="Long paragraph. " * 50000)
+            with pytest.raises(PdfRenderTimeout):
+                await renderer.render(huge, "gemini-2.5-flash")
+
+            renderer.timeout = 30
+            after = await renderer.render(UNICODE_RECORD, "gemini-2.5-flash")
+            return first, after
+        finally:
+            renderer.close()
+
+    first, after = asyncio.run(scenario())
+
+    assert first.startswith(b"%PDF")
+    assert "Привет" in _pdf_text(after)
+
+
+@needs_font
+def test_timeout_does_not_fail_renders_queued_on_the_same_pool():
+    async def scenario():
+        renderer = PdfRenderer(workers=1, timeout=30, regular_font_path=str(REGULAR_FONT), bold_font_path=str(BOLD_FONT))
+        try:
+            await renderer.render(UNICODE_RECORD, "gemini-2.5-flash")
+            huge = dict(UNICODE_RECORD, summary="Long paragraph. " * 50000)
+            stuck = asyncio.create_task(renderer.render(huge, "gemini-2.5-flash", timeout=1))
+            await asyncio.sleep(0.2)
+            # Queued behind the stuck render on the single worker
+            start = asyncio.get_running_loop().time()
+            queued = await renderer.render(UNICODE_RECORD, "gemini-2.5-flash", timeout=60)
+            elapsed = asyncio.get_running_loop().time() - start
+            with pytest.raises(PdfRenderTimeout):
+                await stuck
+            return queued, elapsed
+        finally:
+            renderer.close()
+
+    queued, elapsed = asyncio.run(scenario())
+
+    assert "Привет" in _pdf_text(queued)
+    assert elapsed < 30
+
+
+@needs_font
+def test_time_queued_behind_other_renders_does_not_count_against_the_timeout():
+    async def scenario():
+        renderer = PdfRenderer(workers=1, timeout=30, regular_font_path=str(REGULAR_FONT), bold_font_path=str(BOLD_FONT))
+        try:
+            await renderer.render(UNICODE_RECORD, "gemini-2.5-flash")
+            start = asyncio.get_running_loop().time()
+            long_record = dict(UNICODE_RECORD, summary="Long paragraph. " * 1000)
+            single = await renderer.render(long_record, "gemini-2.5-flash")
+            budget = (asyncio.get_running_loop().time() - start) * 2
+            # Each render fits its budget, but the last one queues for longer than that
+            results = await asyncio.gather(*(
+                renderer.render(long_record, "gemini-2.5-flash", timeout=budget) for _ in range(3)
+            ))
+            return single, results
+        finally:
+            renderer.close()
+
+    single, results = asyncio.run(scenario())
+
+    assert len(results) == 3
+    assert all(len(result) == len(single) for result in results)
+
+
+def test_html_chunks_split_only_between_top_level_blocks():
+    html = "<h3>Title</h3><p>one</p>\n<ul>\n<li>a</li>\n<li>b</li>\n</ul>\n<p>two<br />three</p><hr />"
+
+    chunks = _html_chunks(html, limit=10)
+
+    assert "".join(chunks) == html
+    assert chunks[2] == "\n<ul>\n<li>a</li>\n<li>b</li>\n</ul>"
+    assert all(chunk.count("<ul>") == chunk.count("</ul>") for chunk in chunks)
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from tinydb import TinyDB
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from retention import RetentionManager, RetentionPolicy
+from storage import InterProcessLock, current_change_seq, refresh_tinydb
+
+NOW = datetime(2026, 1, 31, tzinfo=timezone.utc)
+
+
+def test_policy_applies_age_then_count_and_bytes():
+    items = [(f"item-{day}", NOW - timedelta(days=day), 10) for day in range(10)]
+
+    assert RetentionPolicy().select_expired(items, NOW) == []
+    assert sorted(RetentionPolicy(max_age_days=7.5).select_expired(items, NOW)) == ["item-8", "item-9"]
+    assert RetentionPolicy(max_count=8).select_expired(items, NOW) == ["item-9", "item-8"]
+    assert RetentionPolicy(max_bytes=75).select_expired(items, NOW) == ["item-9", "item-8", "item-7"]
+
+
+def test_policy_from_env(monkeypatch):
+    monkeypatch.setenv("SOURCE_RETENTION_MAX_AGE_DAYS", "30")
+    monkeypatch.setenv("SOURCE_RETENTION_MAX_BYTES", "1024")
+    monkeypatch.delenv("SOURCE_RETENTION_MAX_COUNT", raising=False)
+
+    assert RetentionPolicy.from_env("SOURCE_RETENTION") == RetentionPolicy(max_age_days=30.0, max_bytes=1024)
+
+
+@pytest.fixture
+def store(tmp_path):
+    papers_dir = tmp_path / "papers"
+    papers_dir.mkdir()
+    db = TinyDB(str(tmp_path / "db.json"))
+    lock = InterProcessLock(tmp_path / "db.json.lock", on_acquire=lambda: refresh_tinydb(db))
+    yield db, lock, papers_dir, tmp_path
+    db.close()
+
+
+def _manager(store, source_policy=None, analysis_policy=None):
+    db, lock, papers_dir, tmp_path = store
+    return RetentionManager(
+        get_db=lambda: db,
+        db_lock=lock,
+        papers_dir=papers_dir,
+        db_path=tmp_path / "db.json",
+        lock_path=tmp_path / "retention.lock",
+        source_policy=source_policy or RetentionPolicy(),
+        analysis_policy=analysis_policy or RetentionPolicy(),
+        batch_size=1,
+        batch_pause=0,
+    )
+
+
+def _add_paper(db, papers_dir, name, age_days):
+    pdf_path = papers_dir / f"{name}.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 " + name.encode())
+    mtime = (NOW - timedelta(days=age_days)).timestamp()
+    os.utime(pdf_path, (mtime, mtime))
+    db.insert({
+        "id": name,
+        "pdf_path": str(pdf_path),
+        "mode": "document",
+        "created_at": (NOW - timedelta(days=age_days)).isoformat(),
+    })
+    return pdf_path
+
+
+def test_expired_analyses_are_removed_with_their_sources(store):
+    db, _, papers_dir, _ = store
+    old = _add_paper(db, papers_dir, "old", age_days=40)
+    new = _add_paper(db, papers_dir, "new", age_days=1)
+
+    result = asyncio.run(_manager(store, analysis_policy=RetentionPolicy(max_age_days=30)).run_once(now=NOW))
+
+    assert result["removed_analyses"] == 1
+    assert [record["id"] for record in db.all()] == ["new"]
+    assert not old.exists()
+    assert new.exists()
+
+
+def test_expired_sources_keep_their_analyses(store):
+    db, _, papers_dir, _ = store
+    paths = [_add_paper(db, papers_dir, f"paper-{age}", age_days=age) for age in (1, 2, 3)]
+
+    result = asyncio.run(_manager(store, source_policy=RetentionPolicy(max_count=1)).run_once(now=NOW))
+
+    assert result["removed_sources"] == 2
+    assert [path.exists() for path in paths] == [True, False, False]
+    assert len(db.all()) == 3
+    assert [record["pdf_path"] for record in db.all()] == [str(paths[0]), None, None]
+
+
+def test_clearing_expired_sources_advances_the_change_seq(store):
+    db, _, papers_dir, _ = store
+    _add_paper(db, papers_dir, "paper-1", age_days=1)
+    _add_paper(db, papers_dir, "paper-2", age_days=2)
+    seq = current_change_seq(db)
+
+    asyncio.run(_manager(store, source_policy=RetentionPolicy(max_count=1)).run_once(now=NOW))
+
+    assert current_change_seq(db) == seq + 1
+    assert db.search(lambda record: record["id"] == "paper-2")[0]["seq"] == seq + 1
+
+
+def test_orphaned_files_respect_grace_period(store):
+    db, _, papers_dir, _ = store
+    stale = papers_dir / "stale_orphan.pdf"
+    stale.write_bytes(b"stale")
+    mtime = (NOW - timedelta(days=1)).timestamp()
+    os.utime(stale, (mtime, mtime))
+    in_flight = papers_dir / "upload_in_progress.pdf"
+    in_flight.write_bytes(b"fresh")
+    os.utime(in_flight, (NOW.timestamp(), NOW.timestamp()))
+
+    result = asyncio.run(_manager(store).run_once(now=NOW))
+
+    assert result["removed_orphans"] == 1
+    assert not stale.exists()
+    assert in_flight.exists()
+
+
+def test_sweep_is_skipped_while_another_worker_holds_the_lock(store):
+    _, _, _, tmp_path = store
+    other_worker = InterProcessLock(tmp_path / "retention.lock")
+    manager = _manager(store)
+
+    with other_worker:
+        assert asyncio.run(manager.run_once(now=NOW)) is None
+    assert asyncio.run(manager.run_once(now=NOW)) is not None
+
+
+def test_last_sweep_is_shared_between_workers(store):
+    assert _manager(store).usage()["last_sweep"] is None
+
+    result = asyncio.run(_manager(store).run_once(now=NOW))
+
+    assert _manager(store).usage()["last_sweep"] == result
+
+
+def test_usage_reports_sources_and_analyses(store):
+    db, _, papers_dir, _ = store
+    _add_paper(db, papers_dir, "kept", age_days=1)
+    (papers_dir / "orphan.pdf").write_bytes(b"orphan")
+
+    usage = _manager(store, source_policy=RetentionPolicy(max_bytes=2048)).usage()
+
+    assert usage["sources"]["files"] == 2
+    assert usage["sources"]["orphaned_files"] == 1
+    assert usage["sources"]["bytes"] == len(b"%PDF-1.4 kept") + len(b"orphan")
+    assert usage["sources"]["policy"]["max_bytes"] == 2048
+    assert usage["analyses"]["records"] == 1
+    assert usage["analyses"]["file_bytes"] > 0
@@ -0,0 +1,85 @@
+import os
+import sys
+from unittest.mock import patch
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import main
+from llm import LocalProvider
+from retrieval import CHUNK_SEPARATOR, FieldGroup, TfidfIndex, build_index, chunk_text, retrieve_contexts
+from admission import estimate_text_tokens
+from retrieval_fixtures import evidence_recall, load_fixtures, prompt_sizes
+
+
+def test_chunks_overlap_and_cover_the_text():
+    text = " ".join(f"word{i}" for i in range(2000))
+    chunks = chunk_text(text, chunk_chars=500, overlap_chars=100)
+
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert chunks[0].startswith("word0 ") and chunks[-1].endswith("word1999")
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split()[0] in previous.split()
+    assert {word for chunk in chunks for word in chunk.split()} == set(text.split())
+
+
+def test_tfidf_ranks_matching_chunk_first():
+    chunks = [
+        "We train with the Adam optimiser and a batch of 512.",
+        "A key limitation is the drop in accuracy on accented speech.",
+        "Results show a lower word error rate than the baseline.",
+    ]
+    index = TfidfIndex(chunks)
+    assert index.search("limitations limitation drawback", 1) == [1]
+    assert index.search("results baseline", 2)[0] == 2
+
+
+def test_missing_embedding_backend_falls_back_to_tfidf():
+    with patch("retrieval._load_embedding_model", side_effect=ImportError):
+        assert isinstance(build_index(["some text"], "all-MiniLM-L6-v2"), TfidfIndex)
+
+
+def test_lead_chunk_is_always_included():
+    text = "Title Page\n\n" + "\n\n".join(f"Paragraph {i} about methods." for i in range(200)) + "\n\nThe limitation is cost."
+    group = FieldGroup(("limitations",), "limitation cost")
+    lead_group = FieldGroup(("title",), "limitation cost", include_lead=True)
+    contexts = retrieve_contexts(text, [group, lead_group], top_k=1, chunk_chars=300, overlap_chars=50)
+
+    assert "The limitation is cost." in contexts[group]
+    assert "Title Page" not in contexts[group]
+    assert contexts[lead_group].startswith("Title Page")
+    assert CHUNK_SEPARATOR in contexts[lead_group]
+
+
+def test_fixture_evidence_is_retrieved_with_fewer_tokens():
+    groups = main.RETRIEVAL_GROUPS["scientific_paper"]
+    for paper, text in load_fixtures(min_chars=120000):
+        contexts = retrieve_contexts(text, groups, top_k=main.RETRIEVAL_TOP_K, chunk_chars=main.RETRIEVAL_CHUNK_CHARS)
+        assert all(evidence_recall(paper, contexts).values()), paper["name"]
+        full_tokens, retrieval_tokens = prompt_sizes(
+            text, contexts, lambda content, fields: main.build_prompt("scientific_paper", content, fields),
+            main.ANALYSIS_FIELDS["scientific_paper"], estimate_text_tokens)
+        assert retrieval_tokens * 3 < full_tokens
+
+
+def test_long_paper_analysis_uses_retrieved_excerpts(monkeypatch):
+    monkeypatch.setattr("main.RETRIEVAL_MIN_CHARS", 50000)
+    paper, text = load_fixtures(min_chars=100000)[0]
+    provider = LocalProvider()
+    prompts = []
+
+    def generate(model_name, prompt, fields):
+        prompts.append(prompt)
+        return LocalProvider.generate(provider, model_name, prompt, fields)
+
+    with patch.object(provider, "generate", side_effect=generate), patch("main.get_llm_provider", return_value=provider):
+        analysis = main.run_analysis("scientific_paper", "local-model", text)
+
+    assert set(analysis) == set(main.ANALYSIS_FIELDS["scientific_paper"])
+    assert len(prompts) == len(main.RETRIEVAL_GROUPS["scientific_paper"])
+    assert all(len(prompt) < len(text) / 5 for prompt in prompts)
+
+    prompts.clear()
+    with patch.object(provider, "generate", side_effect=generate), patch("main.get_llm_provider", return_value=provider):
+        main.run_analysis("scientific_paper", "local-model", paper["front_matter"])
+    assert len(prompts) == 1
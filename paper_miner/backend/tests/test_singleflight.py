@@ -0,0 +1,188 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from singleflight import FileClaims, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"answer": 42}
+
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(10)))
+        return calls, results, flights.in_flight()
+
+    calls, results, in_flight = asyncio.run(scenario())
+
+    assert calls == 1
+    assert all(result == {"answer": 42} for result in results)
+    assert in_flight == 0
+
+
+def test_different_keys_run_separately_and_results_are_not_cached():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def work(name):
+            calls.append(name)
+            await asyncio.sleep(0.01)
+            return name
+
+        await asyncio.gather(flights.do("a", lambda: work("a")), flights.do("b", lambda: work("b")))
+        await flights.do("a", lambda: work("a"))
+        return calls
+
+    assert asyncio.run(scenario()) == ["a", "b", "a"]
+
+
+def test_errors_propagate_to_every_waiter_and_are_not_remembered():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("model failed")
+
+        results = await asyncio.gather(*(flights.do("key", failing) for _ in range(3)), return_exceptions=True)
+        retry = await flights.do("key", lambda: asyncio.sleep(0, result="ok"))
+        return results, retry
+
+    results, retry = asyncio.run(scenario())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retry == "ok"
+
+
+def test_cancelled_waiter_does_not_cancel_shared_work():
+    async def scenario():
+        flights = SingleFlight()
+        finished = asyncio.Event()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            finished.set()
+            return "done"
+
+        leaving = asyncio.ensure_future(flights.do("key", work))
+        staying = asyncio.ensure_future(flights.do("key", work))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        result = await staying
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return result, finished.is_set()
+
+    assert asyncio.run(scenario()) == ("done", True)
+
+
+def test_shared_work_is_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        work_cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                work_cancelled.set()
+                raise
+
+        waiters = [asyncio.ensure_future(flights.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(work_cancelled.wait(), 1)
+        fresh = await flights.do("key", lambda: asyncio.sleep(0, result="fresh"))
+        return fresh
+
+    assert asyncio.run(scenario()) == "fresh"
+
+
+def _claim_worker(directory, calls_path, results_path):
+    async def work():
+        with open(calls_path, "a") as calls:
+            calls.write("call\n")
+        await asyncio.sleep(0.5)
+        return {"answer": 42}
+
+    result = asyncio.run(FileClaims(directory).run(("digest", "document", "model"), work))
+    with open(results_path, "a") as results:
+        results.write(json.dumps(result) + "\n")
+
+
+def test_file_claims_share_one_execution_between_processes(tmp_path):
+    calls_path = tmp_path / "calls.txt"
+    results_path = tmp_path / "results.txt"
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=_claim_worker, args=(str(tmp_path / "claims"), str(calls_path), str(results_path)))
+        for _ in range(3)
+    ]
+    for proc in workers:
+        proc.start()
+    for proc in workers:
+        proc.join(timeout=60)
+        assert proc.exitcode == 0
+
+    assert calls_path.read_text().splitlines() == ["call"]
+    assert [json.loads(line) for line in results_path.read_text().splitlines()] == [{"answer": 42}] * 3
+    assert list((tmp_path / "claims").glob("*.lock")) == []
+
+
+def test_file_claims_rerun_work_after_a_failure(tmp_path):
+    async def scenario():
+        claims = FileClaims(tmp_path)
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.1)
+            raise RuntimeError("model unavailable")
+
+        async def succeeding():
+            nonlocal calls
+            calls += 1
+            return "ok"
+
+        first = asyncio.create_task(claims.run("key", failing))
+        await asyncio.sleep(0.02)
+        second = await claims.run("key", succeeding)
+        with pytest.raises(RuntimeError):
+            await first
+        return calls, second
+
+    assert asyncio.run(scenario()) == (2, "ok")
+
+
+def test_file_claims_do_not_reuse_results_of_earlier_calls(tmp_path):
+    async def scenario():
+        claims = FileClaims(tmp_path)
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        first = await claims.run("key", work)
+        second = await claims.run("key", work)
+        return calls, first, second
+
+    assert asyncio.run(scenario()) == (2, 1, 2)
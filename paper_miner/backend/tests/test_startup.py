@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Seconds allowed for `import main` in a fresh interpreter (best of several
+# runs). The default is generous so loaded builders pass; tighten it locally,
+# e.g. STARTUP_BUDGET_SECONDS=0.8 pytest
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS") or 2.0)
+
+HEAVY_MODULES = ["google.generativeai", "pypdf", "fpdf", "bs4", "markdown", "requests"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [name for name in %r if name in sys.modules],
+    "db_opened": main.db is not None,
+}))
+""" % HEAVY_MODULES
+
+
+def _probe_import(tmp_path):
+    env = dict(
+        os.environ,
+        DB_PATH=str(tmp_path / "db.json"),
+        BACKEND_LOG_PATH=str(tmp_path / "logs" / "backend.log"),
+        PAPERS_DIR=str(tmp_path / "papers"),
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_has_no_side_effects(tmp_path):
+    probe = _probe_import(tmp_path)
+
+    assert probe["loaded"] == []
+    assert probe["db_opened"] is False
+    assert not (tmp_path / "db.json").exists()
+    assert not (tmp_path / "logs").exists()
+
+
+def test_import_time_within_budget(tmp_path):
+    budget = STARTUP_BUDGET_SECONDS
+    best = min(_probe_import(tmp_path)["elapsed"] for _ in range(3))
+
+    assert best <= budget, f"`import main` took {best:.3f}s, budget is {budget:.3f}s"
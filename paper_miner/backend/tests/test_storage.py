@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import sys
+
+import pytest
+from tinydb import TinyDB
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from storage import InterProcessLock, changes_since, insert_record, refresh_tinydb, remove_records, update_record
+
+
+def _insert_records(db_path, lock_path, worker, count):
+    db = TinyDB(db_path)
+    lock = InterProcessLock(lock_path, on_acquire=lambda: refresh_tinydb(db))
+    for i in range(count):
+        with lock:
+            insert_record(db, {"id": f"{worker}-{i}"})
+    db.close()
+
+
+def test_concurrent_workers_do_not_lose_writes(tmp_path):
+    db_path = str(tmp_path / "db.json")
+    lock_path = str(tmp_path / "db.json.lock")
+    TinyDB(db_path).close()
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_insert_records, args=(db_path, lock_path, w, 25)) for w in range(4)]
+    for proc in workers:
+        proc.start()
+    for proc in workers:
+        proc.join(timeout=60)
+        assert proc.exitcode == 0
+
+    db = TinyDB(db_path)
+    records = db.all()
+    assert len(records) == 100
+    assert len({record.doc_id for record in records}) == 100
+    assert sorted(record["seq"] for record in records) == list(range(1, 101))
+    db.close()
+
+
+def test_refresh_sees_writes_from_another_handle(tmp_path):
+    db_path = str(tmp_path / "db.json")
+    reader = TinyDB(db_path)
+    writer = TinyDB(db_path)
+    lock = InterProcessLock(tmp_path / "db.json.lock", on_acquire=lambda: refresh_tinydb(reader))
+
+    with lock:
+        assert reader.count(lambda doc: True) == 0
+    writer.insert({"id": "a"})
+    with lock:
+        assert reader.count(lambda doc: True) == 1
+        assert reader.insert({"id": "b"}) == 2
+
+
+def test_lock_is_reentrant_and_non_blocking_acquire_fails_when_held(tmp_path):
+    lock_path = tmp_path / "held.lock"
+    first = InterProcessLock(lock_path)
+    second = InterProcessLock(lock_path)
+
+    with first:
+        with first:
+            pass
+        assert second.acquire(blocking=False) is False
+    assert second.acquire(blocking=False) is True
+    second.release()
+
+
+def test_changes_since_reports_additions_updates_and_deletions(tmp_path):
+    db = TinyDB(str(tmp_path / "db.json"))
+    for name in "abc":
+        insert_record(db, {"id": name})
+    update_record(db, 2, {"title": "revised"})
+    assert remove_records(db, [1, 99]) == 1
+
+    changes = changes_since(db, 2)
+    assert changes["reset"] is False
+    assert changes["seq"] == 5
+    assert [r["id"] for r in changes["added"]] == ["c"]
+    assert [r["id"] for r in changes["updated"]] == ["b"]
+    assert changes["deleted"] == ["a"]
+
+    assert changes_since(db, 5)["added"] == []
+    full = changes_since(db, 0)
+    assert full["reset"] is True
+    assert [r["id"] for r in full["added"]] == ["b", "c"]
+    assert changes_since(db, 42)["reset"] is True
+
+
+def test_pruned_tombstones_force_a_reset(tmp_path):
+    db = TinyDB(str(tmp_path / "db.json"))
+    for name in "abcd":
+        insert_record(db, {"id": name})
+    for doc_id in (1, 2, 3):
+        remove_records(db, [doc_id], max_tombstones=2)
+
+    assert changes_since(db, 4)["reset"] is True
+    changes = changes_since(db, 5)
+    assert changes["reset"] is False
+    assert changes["deleted"] == ["b", "c"]
+
+
+def test_shared_holders_exclude_writers_but_not_each_other(tmp_path):
+    lock_path = tmp_path / "rw.lock"
+    reader = InterProcessLock(lock_path)
+    other_reader = InterProcessLock(lock_path)
+    writer = InterProcessLock(lock_path)
+
+    with reader.shared():
+        assert other_reader.acquire(blocking=False, shared=True) is True
+        assert writer.acquire(blocking=False) is False
+        other_reader.release()
+        assert writer.acquire(blocking=False) is False
+    assert writer.acquire(blocking=False) is True
+    assert reader.acquire(blocking=False, shared=True) is False
+    writer.release()
+
+
+def test_shared_lock_cannot_be_upgraded_but_exclusive_nests_shared(tmp_path):
+    lock = InterProcessLock(tmp_path / "rw.lock")
+
+    with lock.shared():
+        with pytest.raises(RuntimeError):
+            lock.acquire()
+    with lock:
+        with lock.shared():
+            pass
+    other = InterProcessLock(tmp_path / "rw.lock")
+    assert other.acquire(blocking=False) is True
+    other.release()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 import './App.css';
@@ -16,29 +16,40 @@ function App() {
   const [historyVisible, setHistoryVisible] = useState(false);
   const [historyList, setHistoryList] = useState([]);
 
+  const [historySyncKey, setHistorySyncKey] = useState(0);
+  // Change sequence of the last history sync; 0 requests the full list
+  const historySeq = useRef(0);
+
   useEffect(() => {
     console.log("App component mounted.");
-    const fetchHistory = async () => {
+    const syncHistory = async () => {
       try {
-        console.log("Fetching history...");
-        const response = await fetch('http://localhost:8000/history', { cache: 'no-cache' });
+        console.log("Syncing history since", historySeq.current);
+        const response = await fetch(`http://localhost:8000/history/changes?since=${historySeq.current}`, { cache: 'no-cache' });
         if (!response.ok) {
           throw new Error('Failed to fetch history');
         }
-        const data = await response.json();
-        setHistoryList(data);
-        console.log("History fetched successfully:", data);
+        const changes = await response.json();
+        setHistoryList(prevList => {
+          // Merge the delta into the list we already hold, keyed by id
+          const entries = new Map(changes.reset ? [] : prevList.map(item => [item.id, item]));
+          changes.deleted.forEach(id => entries.delete(id));
+          [...changes.added, ...changes.updated].forEach(item => entries.set(item.id, item));
+          return Array.from(entries.values());
+        });
+        historySeq.current = changes.seq;
+        console.log("History synced successfully:", changes);
       } catch (err) {
         console.error("Error fetching history:", err);
       }
     };
 
-    fetchHistory();
+    syncHistory();
 
     return () => {
       console.log("App component unmounted.");
     };
-  }, [historyVisible]);
+  }, [historyVisible, historySyncKey]);
 
   useEffect(() => {
     setSelectedFile(null);
@@ -85,6 +96,7 @@ function App() {
         setAnalysisResult(data);
         console.log("Analysis successful:", data, "Received mode:", data.mode);
         setHistoryVisible(true);
+        setHistorySyncKey(key => key + 1);
       } catch (err) {
         console.error("Error during analysis:", err.message);
         setError(err.message);
@@ -122,6 +134,7 @@ function App() {
         setAnalysisResult(data);
         console.log("Analysis successful:", data, "Received mode:", data.mode);
         setHistoryVisible(true);
+        setHistorySyncKey(key => key + 1);
       } catch (err) {
         console.error("Error during analysis:", err.message);
         setError(err.message);
@@ -159,6 +172,7 @@ function App() {
         setAnalysisResult(data);
         console.log("Upload and analysis successful:", data, "Received mode:", data.mode);
         setHistoryVisible(true);
+        setHistorySyncKey(key => key + 1);
       } catch (err) {
         console.error("Error during upload or analysis:", err.message);
         setError(err.message);